@@ -0,0 +1,177 @@
+import asyncio
+import math
+import os
+import time
+from typing import Callable, Dict, Optional
+
+import anyio
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+# Admission control per route class. Each class has a concurrency limit with a
+# bounded wait queue, requests whose expected wait exceeds the class deadline
+# are rejected up front with 503 + Retry-After, and each caller gets a token
+# bucket per class (429 when empty). Expensive classes also get their own
+# thread pool so they cannot occupy the threads interactive requests run on.
+# All state is per worker process.
+
+
+def _env(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+
+class RouteClass:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float,
+                 rate: float, burst: float, pool_threads: Optional[int] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.rate = rate
+        self.burst = burst
+        self.pool_threads = pool_threads
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_overload = 0
+        self.rejected_rate_limited = 0
+        self.service_time = 0.05
+        self._semaphore = None
+        self._pool = None
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    @property
+    def pool(self) -> anyio.CapacityLimiter:
+        # anyio limiters must be created inside the event loop
+        if self._pool is None:
+            self._pool = anyio.CapacityLimiter(self.pool_threads)
+        return self._pool
+
+    def estimated_wait(self) -> float:
+        if self.active < self.max_concurrent:
+            return 0.0
+        return (self.queued + 1) / self.max_concurrent * self.service_time
+
+    def take_token(self, key: str) -> float:
+        # returns 0 when admitted, otherwise the seconds until a token is available
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                self._buckets.clear()
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    def record(self, elapsed: float):
+        self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_overload": self.rejected_overload,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "avg_service_ms": round(self.service_time * 1000, 1),
+        }
+
+
+ROUTE_CLASSES = {
+    "reports": RouteClass(
+        "reports",
+        max_concurrent=int(_env("REPORTS_MAX_CONCURRENT", 4)),
+        max_queue=int(_env("REPORTS_MAX_QUEUE", 16)),
+        max_wait=_env("REPORTS_MAX_WAIT_SECONDS", 10),
+        rate=_env("REPORTS_RATE_PER_SECOND", 1),
+        burst=_env("REPORTS_BURST", 5),
+        pool_threads=int(_env("REPORTS_MAX_CONCURRENT", 4)),
+    ),
+    "interactive": RouteClass(
+        "interactive",
+        max_concurrent=int(_env("INTERACTIVE_MAX_CONCURRENT", 64)),
+        max_queue=int(_env("INTERACTIVE_MAX_QUEUE", 256)),
+        max_wait=_env("INTERACTIVE_MAX_WAIT_SECONDS", 2),
+        rate=_env("INTERACTIVE_RATE_PER_SECOND", 20),
+        burst=_env("INTERACTIVE_BURST", 40),
+    ),
+}
+
+EXPENSIVE_PREFIXES = ("/api/reports/", "/api/import/", "/api/archive/")
+
+
+def route_class(path: str) -> RouteClass:
+    if path.startswith(EXPENSIVE_PREFIXES):
+        return ROUTE_CLASSES["reports"]
+    return ROUTE_CLASSES["interactive"]
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def dispatch(request: Request, call_next, identify: Callable[[Request], str]):
+    if request.method == "OPTIONS" or not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    rc = route_class(request.url.path)
+
+    retry_after = rc.take_token(identify(request))
+    if retry_after:
+        rc.rejected_rate_limited += 1
+        return _reject(429, "Rate limit exceeded", retry_after)
+
+    if rc.queued >= rc.max_queue or rc.estimated_wait() > rc.max_wait:
+        rc.rejected_overload += 1
+        return _reject(503, "Server busy, try again later", max(rc.estimated_wait(), 1))
+
+    rc.queued += 1
+    try:
+        await asyncio.wait_for(rc.semaphore.acquire(), timeout=rc.max_wait)
+    except asyncio.TimeoutError:
+        rc.rejected_overload += 1
+        return _reject(503, "Server busy, try again later", rc.estimated_wait())
+    finally:
+        rc.queued -= 1
+
+    rc.active += 1
+    rc.admitted += 1
+    started = time.monotonic()
+    try:
+        return await call_next(request)
+    finally:
+        rc.record(time.monotonic() - started)
+        rc.active -= 1
+        rc.semaphore.release()
+
+
+async def run_in_pool(class_name: str, func, *args):
+    # Runs a blocking handler body on the route class's own thread pool
+    return await anyio.to_thread.run_sync(func, *args, limiter=ROUTE_CLASSES[class_name].pool)
+
+
+def stats() -> dict:
+    return {name: rc.stats() for name, rc in ROUTE_CLASSES.items()}
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, insert, delete, select, literal
+from sqlalchemy.orm import Session
+
+import models, versions, schedule
+
+# Hot/cold split for project_progress: rows of closed projects are moved to
+# project_progress_archive in small batches by a background thread, so the
+# hot table and its indexes only hold work that is still active.
+
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "600"))
+
+logger = logging.getLogger(__name__)
+
+hot_table = models.ProjectProgress.__table__
+archive_table = models.ProjectProgressArchive.__table__
+PROGRESS_COLUMNS = [column.name for column in hot_table.columns]
+
+
+def archive_closed_projects(db: Session, batch_size: int = ARCHIVE_BATCH_SIZE, stop: Optional[threading.Event] = None) -> int:
+    # Each batch is its own short transaction so writers are never blocked
+    # for long; returns the number of rows moved
+    archived = 0
+    while stop is None or not stop.is_set():
+        # driven from the closed projects so the lookup goes through the
+        # project_id index instead of scanning the hot table
+        closed_projects = select(models.Project.project_id).where(models.Project.closed_at.isnot(None))
+        progress_ids = [
+            row[0] for row in db.query(models.ProjectProgress.progress_id)
+            .filter(models.ProjectProgress.project_id.in_(closed_projects))
+            .limit(batch_size)
+        ]
+        if not progress_ids:
+            break
+        # The ids were read in an earlier transaction; a project reopened
+        # since then must keep its rows, so the condition is checked again
+        batch = and_(hot_table.c.progress_id.in_(progress_ids), hot_table.c.project_id.in_(closed_projects))
+        source = select(
+            *[hot_table.c[name] for name in PROGRESS_COLUMNS], literal(datetime.utcnow())
+        ).where(batch)
+        # OR IGNORE: another worker process may be archiving the same batch
+        db.execute(insert(archive_table).prefix_with("OR IGNORE").from_select(PROGRESS_COLUMNS + ["archived_at"], source))
+        moved = db.execute(delete(hot_table).where(batch)).rowcount
+        versions.bump(db, "project_progress")
+        db.commit()
+        archived += moved
+    return archived
+
+
+def restore_rows(db: Session, project_id: str) -> int:
+    # Moves the project's archived rows back without committing. Should a
+    # hot row with the same (project, subsystem, activity, user) exist, it
+    # is the newer one and the archived copy is dropped.
+    hot_row = select(hot_table.c.progress_id).where(and_(
+        hot_table.c.project_id == archive_table.c.project_id,
+        hot_table.c.subsystem_id == archive_table.c.subsystem_id,
+        hot_table.c.activity_id == archive_table.c.activity_id,
+        hot_table.c.user_id == archive_table.c.user_id,
+    ))
+    source = select(*[archive_table.c[name] for name in PROGRESS_COLUMNS]).where(
+        archive_table.c.project_id == project_id, ~hot_row.exists()
+    )
+    result = db.execute(insert(hot_table).from_select(PROGRESS_COLUMNS, source))
+    db.execute(delete(archive_table).where(archive_table.c.project_id == project_id))
+    return result.rowcount
+
+
+def restore_project(db: Session, project_id: str) -> int:
+    # Reopens the project and moves its archived rows back in one transaction
+    restored = restore_rows(db, project_id)
+    db.query(models.Project).filter(models.Project.project_id == project_id).update(
+        {models.Project.closed_at: None}, synchronize_session=False
+    )
+    versions.bump(db, "project_progress", "projects")
+    db.commit()
+    schedule.invalidate([project_id])
+    return restored
+
+
+class ArchiveWorker:
+    def __init__(self, session_factory, interval: int = ARCHIVE_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="progress-archiver", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def trigger(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            db = self.session_factory()
+            try:
+                archived = archive_closed_projects(db, stop=self._stopped)
+                if archived:
+                    logger.info("archived %d progress rows of closed projects", archived)
+            except Exception:
+                db.rollback()
+                logger.exception("progress archival failed")
+            finally:
+                db.close()
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,193 @@
+import enum
+import logging
+import os
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import insert, inspect
+
+import models
+from database import engine
+
+# Write-behind audit trail. crud records every committed create/update/delete
+# into a bounded in-memory buffer; a background writer drains it into
+# audit_log in batched transactions, so a request never pays for an extra
+# commit. When the buffer is full the recording request waits for the writer
+# (backpressure) and, if it still has no room, flushes the buffer itself;
+# entries are only dropped when that write fails too. stop() flushes
+# whatever is left on shutdown.
+
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "1000"))
+AUDIT_MAX_WAIT_SECONDS = float(os.getenv("AUDIT_MAX_WAIT_SECONDS", "2.0"))
+
+# never copied into the log
+SENSITIVE_FIELDS = {"password"}
+
+logger = logging.getLogger(__name__)
+
+# user the current request acts as, set per request by main.py
+actor: ContextVar[Optional[str]] = ContextVar("audit_actor", default=None)
+
+table = models.AuditLog.__table__
+
+
+def _json_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def snapshot(obj) -> dict:
+    # column values of an ORM object or a row mapping
+    if isinstance(obj, dict):
+        values = obj
+    else:
+        values = {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+    return {key: _json_value(value) for key, value in values.items() if key not in SENSITIVE_FIELDS}
+
+
+def diff(before: dict, after: dict) -> dict:
+    return {
+        key: {"old": before.get(key), "new": value}
+        for key, value in after.items()
+        if before.get(key) != value and key != "updated_at"
+    }
+
+
+class AuditBuffer:
+    def __init__(self, capacity: int = AUDIT_BUFFER_SIZE):
+        self.capacity = capacity
+        self.entries = deque()
+        self.recorded = 0
+        self.written = 0
+        self.blocked = 0
+        self.dropped = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def put(self, entry: dict, max_wait: float = AUDIT_MAX_WAIT_SECONDS):
+        with self._condition:
+            if len(self.entries) >= self.capacity:
+                self.blocked += 1
+                self.wake.set()
+                self._condition.wait_for(lambda: len(self.entries) < self.capacity, timeout=max_wait)
+            if len(self.entries) < self.capacity:
+                self._append(entry)
+                return
+        # the writer is not keeping up (or not running): write in this thread
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("audit log flush failed")
+        with self._condition:
+            if len(self.entries) < self.capacity:
+                self._append(entry)
+            else:
+                self.dropped += 1
+                logger.error("audit buffer full, dropped %s %s of %s", entry["action"], entry["entity_id"], entry["entity"])
+
+    def _append(self, entry: dict):
+        self.entries.append(entry)
+        self.recorded += 1
+        if len(self.entries) >= min(AUDIT_BATCH_SIZE, self.capacity // 2):
+            self.wake.set()
+
+    def _take(self, limit: int) -> List[dict]:
+        with self._condition:
+            batch = [self.entries.popleft() for _ in range(min(limit, len(self.entries)))]
+            self._condition.notify_all()
+            return batch
+
+    def _requeue(self, batch: List[dict]):
+        with self._condition:
+            self.entries.extendleft(reversed(batch))
+
+    def flush(self) -> int:
+        # one transaction per batch; a failed batch goes back to the front
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take(AUDIT_BATCH_SIZE)
+                if not batch:
+                    break
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(table), batch)
+                except Exception:
+                    self._requeue(batch)
+                    raise
+                written += len(batch)
+                self.written += len(batch)
+        return written
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.entries),
+            "capacity": self.capacity,
+            "recorded": self.recorded,
+            "written": self.written,
+            "blocked": self.blocked,
+            "dropped": self.dropped,
+        }
+
+
+buffer = AuditBuffer()
+
+
+def record(entity: str, entity_id: str, action: str, before: Optional[dict] = None, after: Optional[dict] = None):
+    # called by crud after the write is committed
+    if action == "update":
+        changes = diff(before or {}, after or {})
+        if not changes:
+            return
+    elif action == "delete":
+        changes = before
+    else:
+        changes = after
+    buffer.put({
+        "entity": entity,
+        "entity_id": str(entity_id),
+        "action": action,
+        "user_id": actor.get(),
+        "changes": changes,
+        "created_at": datetime.utcnow(),
+    })
+
+
+class AuditWriter:
+    def __init__(self, interval: float = AUDIT_FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        buffer.wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+        # durable flush of everything recorded before shutdown
+        buffer.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            buffer.wake.wait(self.interval)
+            buffer.wake.clear()
+            try:
+                buffer.flush()
+            except Exception:
+                logger.exception("audit log flush failed")
@@ -0,0 +1,152 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+import models
+import migrate_keys
+
+# Compares text vs blob key storage (models.KEY_STORAGE) on a synthetic
+# project_progress table: on-disk size per table/index and query latency.
+#
+#   python bench_keys.py [--rows 1000000]
+
+
+def build_text_database(path: str, rows: int, projects: int):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    now = datetime.utcnow().isoformat(sep=" ")
+    # only the indexes the models create, so the comparison with the blob
+    # copy measures the key storage and nothing else
+    conn = sqlite3.connect(path)
+
+    user_ids = [str(uuid.uuid4()) for _ in range(20)]
+    subsystem_ids = [str(uuid.uuid4()) for _ in range(5)]
+    activity_ids = [str(uuid.uuid4()) for _ in range(26)]
+    project_ids = [str(uuid.uuid4()) for _ in range(projects)]
+    conn.executemany(
+        "INSERT INTO users (user_id, username, password, role, created_at, updated_at) VALUES (?, ?, 'x', 'ENGINEER', ?, ?)",
+        [(user_id, f"user{i}", now, now) for i, user_id in enumerate(user_ids)],
+    )
+    conn.executemany(
+        "INSERT INTO subsystems (subsystem_id, subsystem_name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+        [(subsystem_id, f"SUB{i}", now, now) for i, subsystem_id in enumerate(subsystem_ids)],
+    )
+    conn.executemany(
+        "INSERT INTO activities (activity_id, activity_name, activity_type, associated_with, created_at, updated_at) VALUES (?, ?, 'FPGA', 'SUBSYSTEM', ?, ?)",
+        [(activity_id, f"ACT{i}", now, now) for i, activity_id in enumerate(activity_ids)],
+    )
+    conn.executemany(
+        "INSERT INTO projects (project_id, project_name, program_type, created_by, created_at, updated_at) VALUES (?, ?, 'FPGA', ?, ?, ?)",
+        [(project_id, f"Project {i}", user_ids[0], now, now) for i, project_id in enumerate(project_ids)],
+    )
+
+    rng = random.Random(42)
+    batch = []
+    for _ in range(rows):
+        batch.append((
+            str(uuid.uuid4()),
+            rng.choice(project_ids),
+            rng.choice(subsystem_ids),
+            rng.choice(activity_ids),
+            rng.choice(user_ids),
+            now,
+            now,
+        ))
+        if len(batch) >= 50000:
+            conn.executemany(
+                "INSERT INTO project_progress (progress_id, project_id, subsystem_id, activity_id, user_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'COMPLETED', ?, ?)",
+                batch,
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO project_progress (progress_id, project_id, subsystem_id, activity_id, user_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'COMPLETED', ?, ?)",
+            batch,
+        )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def object_sizes(conn):
+    return dict(conn.execute(
+        "SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE '%progress%' GROUP BY name ORDER BY name"
+    ).fetchall())
+
+
+def time_query(conn, sql, params_list, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for params in params_list:
+            conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / (repeat * len(params_list)) * 1000
+
+
+def measure(path: str):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA cache_size = -65536")
+    progress_ids = [row[0] for row in conn.execute("SELECT progress_id FROM project_progress ORDER BY random() LIMIT 200")]
+    project_ids = [row[0] for row in conn.execute("SELECT project_id FROM projects ORDER BY random() LIMIT 50")]
+    results = {
+        "size": object_sizes(conn),
+        "file": os.path.getsize(path),
+        "point lookup by progress_id": time_query(
+            conn, "SELECT * FROM project_progress WHERE progress_id = ?", [(i,) for i in progress_ids], repeat=5
+        ),
+        "progress rows of one project": time_query(
+            conn, "SELECT progress_id, activity_id, status FROM project_progress WHERE project_id = ?", [(i,) for i in project_ids]
+        ),
+        "completed per project (join)": time_query(
+            conn,
+            "SELECT p.project_name, COUNT(*) FROM project_progress pp JOIN projects p ON p.project_id = pp.project_id "
+            "WHERE pp.status = 'COMPLETED' GROUP BY p.project_name",
+            [()],
+        ),
+    }
+    conn.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark text vs blob key storage")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--projects", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench_keys_")
+    try:
+        text_path = os.path.join(workdir, "text.db")
+        blob_path = os.path.join(workdir, "blob.db")
+        start = time.perf_counter()
+        build_text_database(text_path, args.rows, args.projects)
+        print(f"built {args.rows:,} progress rows in {time.perf_counter() - start:.1f}s")
+        shutil.copy(text_path, blob_path)
+        migrate_keys.migrate(blob_path, "blob")
+
+        text = measure(text_path)
+        blob = measure(blob_path)
+
+        print(f"\n{'':40} {'text':>14} {'blob':>14}")
+        print(f"{'database file (bytes)':40} {text['file']:>14,} {blob['file']:>14,}")
+        for name in sorted(set(text["size"]) | set(blob["size"])):
+            print(f"{name:40} {text['size'].get(name, 0):>14,} {blob['size'].get(name, 0):>14,}")
+        for name in ("point lookup by progress_id", "progress rows of one project", "completed per project (join)"):
+            print(f"{name + ' (ms)':40} {text[name]:>14.3f} {blob[name]:>14.3f}")
+    finally:
+        shutil.rmtree(workdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import models
+import search
+
+# Latency of search.search() over a synthetic database with many progress
+# notes: a term most notes contain, a rare term, a prefix, an engineer's own
+# notes and a deep page.
+#
+#   python bench_search.py [--rows 1000000]
+
+COMMON_WORDS = ["note", "checked", "review", "pending", "signed", "test", "board", "firmware"]
+
+
+def build_database(path: str, rows: int, projects: int, users: int):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    now = datetime.utcnow().isoformat(sep=" ")
+    conn = sqlite3.connect(path)
+    rng = random.Random(42)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    subsystem_ids = [str(uuid.uuid4()) for _ in range(5)]
+    activity_ids = [str(uuid.uuid4()) for _ in range(26)]
+    project_ids = [str(uuid.uuid4()) for _ in range(projects)]
+    rare_words = [f"part{i}" for i in range(20000)]
+    conn.executemany(
+        "INSERT INTO users (user_id, username, password, role, created_at, updated_at) VALUES (?, ?, 'x', 'ENGINEER', ?, ?)",
+        [(user_id, f"user{i}", now, now) for i, user_id in enumerate(user_ids)],
+    )
+    conn.executemany(
+        "INSERT INTO subsystems (subsystem_id, subsystem_name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+        [(subsystem_id, f"SUB{i}", now, now) for i, subsystem_id in enumerate(subsystem_ids)],
+    )
+    conn.executemany(
+        "INSERT INTO activities (activity_id, activity_name, activity_type, associated_with, created_at, updated_at) VALUES (?, ?, 'FPGA', 'SUBSYSTEM', ?, ?)",
+        [(activity_id, f"Activity {i}", now, now) for i, activity_id in enumerate(activity_ids)],
+    )
+    conn.executemany(
+        "INSERT INTO projects (project_id, project_name, description, program_type, created_by, created_at, updated_at) VALUES (?, ?, ?, 'FPGA', ?, ?, ?)",
+        [(project_id, f"Project {i}", f"review of board {i}", user_ids[0], now, now) for i, project_id in enumerate(project_ids)],
+    )
+
+    insert = (
+        "INSERT INTO project_progress (progress_id, project_id, subsystem_id, activity_id, user_id, status, notes, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, 'IN_PROGRESS', ?, ?, ?)"
+    )
+    batch = []
+    for _ in range(rows):
+        words = rng.sample(COMMON_WORDS, 3) + rng.sample(rare_words, 2)
+        batch.append((
+            str(uuid.uuid4()),
+            rng.choice(project_ids),
+            rng.choice(subsystem_ids),
+            rng.choice(activity_ids),
+            rng.choice(user_ids),
+            " ".join(words),
+            now,
+            now,
+        ))
+        if len(batch) >= 50000:
+            conn.executemany(insert, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+    conn.commit()
+    conn.close()
+
+    # the indexes are built from the existing rows
+    engine = create_engine(f"sqlite:///{path}")
+    search.create_search_indexes(engine)
+    engine.dispose()
+    return user_ids
+
+
+def time_search(db: Session, user, q: str, repeat: int, **kwargs) -> float:
+    search.search(db, q, user, **kwargs)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        search.search(db, q, user, **kwargs)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark full-text search latency")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--projects", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench_search_")
+    try:
+        path = os.path.join(workdir, "search.db")
+        start = time.perf_counter()
+        user_ids = build_database(path, args.rows, args.projects, args.users)
+        print(f"built {args.rows:,} progress notes and search indexes in {time.perf_counter() - start:.1f}s")
+
+        admin = SimpleNamespace(role="ADMIN", user_id=None)
+        engineer = SimpleNamespace(role="ENGINEER", user_id=user_ids[1])
+        cases = [
+            ("term in most notes", admin, "note", {}),
+            ("term in most notes, notes only", admin, "note", {"entity_types": ["note"]}),
+            ("rare term", admin, "part123", {}),
+            ("prefix", admin, "rev", {}),
+            ("two terms", admin, "board firm", {}),
+            ("engineer's own notes", engineer, "note", {}),
+            ("page at offset 500", admin, "note", {"skip": 500}),
+        ]
+        engine = create_engine(f"sqlite:///{path}")
+        with Session(engine) as db:
+            print(f"\n{'':40} {'ms':>10}")
+            for name, user, q, kwargs in cases:
+                print(f"{name:40} {time_search(db, user, q, args.repeat, **kwargs):>10.2f}")
+        engine.dispose()
+    finally:
+        shutil.rmtree(workdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
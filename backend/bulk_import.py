@@ -0,0 +1,393 @@
+import argparse
+import codecs
+import csv
+import sys
+import uuid
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import Column, MetaData, Table, and_, insert, update, delete, select
+from sqlalchemy.orm import Session
+
+import models, schemas, catalog, versions, schedule, audit
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+ENTITIES = ("projects", "project-subsystem-mappings", "project-progress")
+
+TABLES = {
+    "projects": "projects",
+    "project-subsystem-mappings": "project_subsystem_mappings",
+    "project-progress": "project_progress",
+}
+
+
+# keys of the progress chunk being imported, joined against the
+# (project, subsystem, activity, user) index to find the existing rows
+chunk_keys = Table(
+    "import_progress_keys", MetaData(),
+    Column("project_id", models.UUIDKey),
+    Column("subsystem_id", models.UUIDKey),
+    Column("activity_id", models.UUIDKey),
+    Column("user_id", models.UUIDKey),
+    prefixes=["TEMPORARY"],
+)
+
+
+class RowError(Exception):
+    pass
+
+
+def _clean(row: dict) -> dict:
+    # csv gives "" for empty cells; treat them as missing
+    return {
+        (key or "").strip(): (value.strip() or None) if isinstance(value, str) else value
+        for key, value in row.items()
+        if key
+    }
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+class ImportLookup:
+    # In-memory name -> id maps so rows can reference subsystems, activities,
+    # projects and users by name without a query per row
+
+    def __init__(self, db: Session):
+        reference = catalog.get_catalog(db)
+        self.subsystem_ids = set(reference.subsystems_by_id)
+        self.subsystems_by_name: Dict[str, str] = {
+            subsystem.subsystem_name.upper(): subsystem.subsystem_id for subsystem in reference.subsystems
+        }
+
+        self.activity_ids = set(reference.activities_by_id)
+        self.activities_by_name: Dict[str, List[Tuple[str, str]]] = {}
+        for activity in reference.activities:
+            self.activities_by_name.setdefault(activity.activity_name.upper(), []).append(
+                (activity.activity_id, activity.activity_type)
+            )
+
+        self.project_ids = set()
+        self.closed_project_ids = set()
+        self.projects_by_name: Dict[str, List[str]] = {}
+        for project_id, name, closed_at in db.query(
+            models.Project.project_id, models.Project.project_name, models.Project.closed_at
+        ):
+            self.project_ids.add(project_id)
+            self.projects_by_name.setdefault(name.upper(), []).append(project_id)
+            if closed_at:
+                self.closed_project_ids.add(project_id)
+
+        self.users_by_name: Dict[str, str] = {
+            username: user_id for user_id, username in db.query(models.User.user_id, models.User.username)
+        }
+
+    def project_id(self, row: dict) -> Optional[str]:
+        project_id = row.get("project_id")
+        if project_id:
+            if project_id not in self.project_ids:
+                raise RowError(f"Unknown project_id '{project_id}'")
+            return project_id
+        name = row.get("project_name")
+        if not name:
+            return None
+        matches = self.projects_by_name.get(name.upper(), [])
+        if not matches:
+            raise RowError(f"Unknown project '{name}'")
+        if len(matches) > 1:
+            raise RowError(f"Project name '{name}' is ambiguous, use project_id")
+        return matches[0]
+
+    def subsystem_id(self, row: dict) -> Optional[str]:
+        subsystem_id = row.get("subsystem_id")
+        if subsystem_id:
+            if subsystem_id not in self.subsystem_ids:
+                raise RowError(f"Unknown subsystem_id '{subsystem_id}'")
+            return subsystem_id
+        name = row.get("subsystem_name")
+        if not name:
+            return None
+        if name.upper() not in self.subsystems_by_name:
+            raise RowError(f"Unknown subsystem '{name}'")
+        return self.subsystems_by_name[name.upper()]
+
+    def activity_id(self, row: dict) -> Optional[str]:
+        activity_id = row.get("activity_id")
+        if activity_id:
+            if activity_id not in self.activity_ids:
+                raise RowError(f"Unknown activity_id '{activity_id}'")
+            return activity_id
+        name = row.get("activity_name")
+        if not name:
+            return None
+        matches = self.activities_by_name.get(name.upper(), [])
+        activity_type = row.get("activity_type")
+        if activity_type:
+            matches = [match for match in matches if match[1] == activity_type.upper()]
+        if not matches:
+            raise RowError(f"Unknown activity '{name}'")
+        if len(matches) > 1:
+            raise RowError(f"Activity name '{name}' is ambiguous, add activity_type or use activity_id")
+        return matches[0][0]
+
+    def user_id(self, username: str) -> str:
+        if username not in self.users_by_name:
+            raise RowError(f"Unknown user '{username}'")
+        return self.users_by_name[username]
+
+
+def _chunks(rows: Iterable[dict], size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BulkImporter:
+    def __init__(self, db: Session, entity: str, current_user: models.User):
+        if entity not in ENTITIES:
+            raise ValueError(f"Unsupported import entity '{entity}'")
+        self.db = db
+        self.entity = entity
+        self.current_user = current_user
+        self.lookup = ImportLookup(db)
+        self.total_rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[schemas.ImportRowError] = []
+        self.touched_projects = set()
+        # progress rows written by earlier chunks of this import, by key
+        self.progress_rows: Dict[tuple, tuple] = {}
+
+    def _error(self, row_number: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.ImportRowError(row=row_number, error=message))
+
+    def _validate(self, numbered_rows: List[Tuple[int, dict]]):
+        builder = {
+            "projects": self._build_project,
+            "project-subsystem-mappings": self._build_mapping,
+            "project-progress": self._build_progress,
+        }[self.entity]
+        valid = []
+        for row_number, row in numbered_rows:
+            try:
+                valid.append((row_number, builder(_clean(row))))
+            except RowError as e:
+                self._error(row_number, str(e))
+            except ValidationError as e:
+                self._error(row_number, _format_validation_error(e))
+        return valid
+
+    def _build_project(self, row: dict):
+        return schemas.ProjectCreate(**row), self.current_user.user_id
+
+    def _build_mapping(self, row: dict):
+        row["project_id"] = self.lookup.project_id(row)
+        row["subsystem_id"] = self.lookup.subsystem_id(row)
+        return schemas.ProjectSubsystemMappingCreate(**row), self.current_user.user_id
+
+    def _build_progress(self, row: dict):
+        row["project_id"] = self.lookup.project_id(row)
+        if row["project_id"] in self.lookup.closed_project_ids:
+            raise RowError("Project is closed")
+        row["subsystem_id"] = self.lookup.subsystem_id(row)
+        row["activity_id"] = self.lookup.activity_id(row)
+        if row.get("status"):
+            row["status"] = row["status"].upper()
+        user_id = self.current_user.user_id
+        username = row.get("username")
+        if username and username != self.current_user.username:
+            if self.current_user.role not in ["PM", "DPD"]:
+                raise RowError("Not enough permissions to import progress for other users")
+            user_id = self.lookup.user_id(username)
+        return schemas.ProjectProgressCreate(**row), user_id
+
+    def _insert_projects(self, valid):
+        rows = [
+            {
+                "project_id": str(uuid.uuid4()),
+                "project_name": project.project_name,
+                "program_type": project.program_type,
+                "description": project.description,
+                "created_by": created_by,
+            }
+            for _, (project, created_by) in valid
+        ]
+        self.db.execute(insert(models.Project), rows)
+        for row in rows:
+            self.lookup.project_ids.add(row["project_id"])
+            self.lookup.projects_by_name.setdefault(row["project_name"].upper(), []).append(row["project_id"])
+        return len(rows)
+
+    def _insert_mappings(self, valid):
+        # Same semantics as crud.create_project_subsystem_mapping: a project
+        # has at most one mapping and a new assignment replaces the old one
+        latest = {}
+        for _, (mapping, assigned_by) in valid:
+            latest[mapping.project_id] = {
+                "mapping_id": str(uuid.uuid4()),
+                "project_id": mapping.project_id,
+                "subsystem_id": mapping.subsystem_id,
+                "assigned_by": assigned_by,
+            }
+        self.db.execute(
+            delete(models.ProjectSubsystemMapping).where(
+                models.ProjectSubsystemMapping.project_id.in_(list(latest))
+            )
+        )
+        self.db.execute(insert(models.ProjectSubsystemMapping), list(latest.values()))
+        return len(valid)
+
+    def _insert_progress(self, valid):
+        # Same semantics as crud.create_or_update_project_progress, applied
+        # per chunk: one lookup of the chunk's keys, then executemany
+        latest = {}
+        for _, (progress, user_id) in valid:
+            key = (progress.project_id, progress.subsystem_id, progress.activity_id, user_id)
+            latest[key] = progress
+
+        self.touched_projects.update(key[0] for key in latest)
+        existing = {key: self.progress_rows[key] for key in latest if key in self.progress_rows}
+        unseen = [key for key in latest if key not in existing]
+        if unseen:
+            connection = self.db.connection()
+            chunk_keys.create(connection, checkfirst=True)
+            connection.execute(insert(chunk_keys), [
+                {"project_id": key[0], "subsystem_id": key[1], "activity_id": key[2], "user_id": key[3]}
+                for key in unseen
+            ])
+            hot = models.ProjectProgress.__table__
+            for row in connection.execute(
+                select(
+                    hot.c.progress_id, hot.c.project_id, hot.c.subsystem_id,
+                    hot.c.activity_id, hot.c.user_id, hot.c.start_date, hot.c.completion_date,
+                ).select_from(chunk_keys).join(hot, and_(
+                    hot.c.project_id == chunk_keys.c.project_id,
+                    hot.c.subsystem_id == chunk_keys.c.subsystem_id,
+                    hot.c.activity_id == chunk_keys.c.activity_id,
+                    hot.c.user_id == chunk_keys.c.user_id,
+                ))
+            ):
+                key = (row.project_id, row.subsystem_id, row.activity_id, row.user_id)
+                existing[key] = (row.progress_id, row.start_date, row.completion_date)
+            connection.execute(delete(chunk_keys))
+
+        today = date.today()
+        inserts, updates = [], []
+        for key, progress in latest.items():
+            current = existing.get(key)
+            if current:
+                progress_id, start_date, completion_date = current
+                values = {"progress_id": progress_id, "status": progress.status, "notes": progress.notes}
+                if progress.status == models.ProgressStatus.IN_PROGRESS and not start_date:
+                    values["start_date"] = start_date = today
+                elif progress.status == models.ProgressStatus.COMPLETED and not completion_date:
+                    values["completion_date"] = completion_date = today
+                updates.append(values)
+                self.progress_rows[key] = (progress_id, start_date, completion_date)
+            else:
+                values = {
+                    "progress_id": str(uuid.uuid4()),
+                    "project_id": key[0],
+                    "subsystem_id": key[1],
+                    "activity_id": key[2],
+                    "user_id": key[3],
+                    "status": progress.status,
+                    "notes": progress.notes,
+                    "start_date": today if progress.status == models.ProgressStatus.IN_PROGRESS else None,
+                    "completion_date": today if progress.status == models.ProgressStatus.COMPLETED else None,
+                }
+                inserts.append(values)
+                self.progress_rows[key] = (values["progress_id"], values["start_date"], values["completion_date"])
+
+        # bulk UPDATE by primary key needs a uniform set of columns per statement
+        for columns in {tuple(sorted(values)) for values in updates}:
+            self.db.execute(
+                update(models.ProjectProgress),
+                [values for values in updates if tuple(sorted(values)) == columns],
+            )
+        if inserts:
+            self.db.execute(insert(models.ProjectProgress), inserts)
+        return len(valid)
+
+    def run(self, rows: Iterable[dict], chunk_size: int = CHUNK_SIZE) -> schemas.ImportResult:
+        writer = {
+            "projects": self._insert_projects,
+            "project-subsystem-mappings": self._insert_mappings,
+            "project-progress": self._insert_progress,
+        }[self.entity]
+        try:
+            # the whole import is one write transaction; taking the write lock
+            # up front keeps the existing-row lookups valid until the writes
+            self.db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            for chunk in _chunks(enumerate(rows, start=1), chunk_size):
+                self.total_rows += len(chunk)
+                valid = self._validate(chunk)
+                if valid:
+                    self.imported += writer(valid)
+            versions.bump(self.db, TABLES[self.entity])
+            self.db.commit()
+            schedule.invalidate(self.touched_projects)
+            # one entry per import rather than one per row
+            audit.record(TABLES[self.entity], str(uuid.uuid4()), "import", after={
+                "total_rows": self.total_rows, "imported": self.imported, "failed": self.failed,
+            })
+        except Exception:
+            self.db.rollback()
+            raise
+        return schemas.ImportResult(
+            entity=self.entity,
+            total_rows=self.total_rows,
+            imported=self.imported,
+            failed=self.failed,
+            errors=self.errors,
+        )
+
+
+def import_csv(db: Session, entity: str, stream, current_user: models.User) -> schemas.ImportResult:
+    # stream is a binary file object; rows are parsed lazily so the upload is
+    # never held in memory as a whole
+    reader = csv.DictReader(codecs.iterdecode(stream, "utf-8-sig"))
+    return BulkImporter(db, entity, current_user).run(reader)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import projects, mappings or progress from CSV")
+    parser.add_argument("entity", choices=ENTITIES)
+    parser.add_argument("csv_file")
+    parser.add_argument("--username", default="admin", help="user recorded as creator / assigner / progress owner")
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == args.username).first()
+        if user is None:
+            parser.error(f"Unknown user '{args.username}'")
+        with open(args.csv_file, "rb") as stream:
+            result = import_csv(db, args.entity, stream, user)
+    finally:
+        db.close()
+        audit.buffer.flush()
+
+    print(f"{result.entity}: {result.imported} of {result.total_rows} rows imported, {result.failed} failed")
+    for error in result.errors:
+        print(f"  row {error.row}: {error.error}", file=sys.stderr)
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
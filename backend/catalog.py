@@ -0,0 +1,133 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models, versions
+
+# Process-local copy of the near-static reference tables (subsystems,
+# activities and the activity dependency graph). Loaded once, swapped
+# wholesale whenever crud writes to them.
+
+
+def _enum_value(value):
+    return value.value if hasattr(value, "value") else value
+
+
+class SubsystemRecord:
+    __slots__ = ("subsystem_id", "subsystem_name", "description", "created_at", "updated_at")
+
+    def __init__(self, row: models.Subsystem):
+        self.subsystem_id = row.subsystem_id
+        self.subsystem_name = row.subsystem_name
+        self.description = row.description
+        self.created_at = row.created_at
+        self.updated_at = row.updated_at
+
+
+class ActivityRecord:
+    __slots__ = ("activity_id", "activity_name", "activity_type", "associated_with", "description",
+                 "estimated_duration_days", "created_at", "updated_at")
+
+    def __init__(self, row: models.Activity):
+        self.activity_id = row.activity_id
+        self.activity_name = row.activity_name
+        self.activity_type = _enum_value(row.activity_type)
+        self.associated_with = _enum_value(row.associated_with)
+        self.description = row.description
+        self.estimated_duration_days = row.estimated_duration_days
+        self.created_at = row.created_at
+        self.updated_at = row.updated_at
+
+
+class DependencyRecord:
+    __slots__ = ("dependency_id", "activity_id", "depends_on_id", "created_at")
+
+    def __init__(self, row: models.ActivityDependency):
+        self.dependency_id = row.dependency_id
+        self.activity_id = row.activity_id
+        self.depends_on_id = row.depends_on_id
+        self.created_at = row.created_at
+
+
+class ReferenceCatalog:
+    __slots__ = (
+        "subsystems",
+        "subsystems_by_id",
+        "subsystems_by_name",
+        "activities",
+        "activities_by_id",
+        "activities_by_name",
+        "activities_by_type_and_association",
+        "dependencies",
+        "predecessors",
+        "successors",
+    )
+
+    def __init__(self, subsystems: List[SubsystemRecord], activities: List[ActivityRecord],
+                 dependencies: List[DependencyRecord]):
+        self.subsystems = subsystems
+        self.subsystems_by_id: Dict[str, SubsystemRecord] = {s.subsystem_id: s for s in subsystems}
+        self.subsystems_by_name: Dict[str, SubsystemRecord] = {s.subsystem_name: s for s in subsystems}
+        self.activities = activities
+        self.activities_by_id: Dict[str, ActivityRecord] = {a.activity_id: a for a in activities}
+        self.activities_by_name: Dict[str, List[ActivityRecord]] = {}
+        self.activities_by_type_and_association: Dict[Tuple[str, str], List[ActivityRecord]] = {}
+        for activity in activities:
+            self.activities_by_name.setdefault(activity.activity_name, []).append(activity)
+            key = (activity.activity_type, activity.associated_with)
+            self.activities_by_type_and_association.setdefault(key, []).append(activity)
+        self.dependencies = dependencies
+        self.predecessors: Dict[str, List[str]] = {}
+        self.successors: Dict[str, List[str]] = {}
+        for dependency in dependencies:
+            self.predecessors.setdefault(dependency.activity_id, []).append(dependency.depends_on_id)
+            self.successors.setdefault(dependency.depends_on_id, []).append(dependency.activity_id)
+
+    def subsystem_name(self, subsystem_id: str) -> Optional[str]:
+        subsystem = self.subsystems_by_id.get(subsystem_id)
+        return subsystem.subsystem_name if subsystem else None
+
+    def activity_name(self, activity_id: str) -> Optional[str]:
+        activity = self.activities_by_id.get(activity_id)
+        return activity.activity_name if activity else None
+
+    def activities_for(self, activity_type: str, associated_with: str) -> List[ActivityRecord]:
+        return self.activities_by_type_and_association.get(
+            (_enum_value(activity_type), _enum_value(associated_with)), []
+        )
+
+
+_catalog: Optional[ReferenceCatalog] = None
+_lock = threading.Lock()
+
+
+def load(db: Session) -> ReferenceCatalog:
+    subsystems = [SubsystemRecord(row) for row in db.query(models.Subsystem)]
+    activities = [ActivityRecord(row) for row in db.query(models.Activity)]
+    dependencies = [DependencyRecord(row) for row in db.query(models.ActivityDependency)]
+    return ReferenceCatalog(subsystems, activities, dependencies)
+
+
+def refresh(db: Session) -> ReferenceCatalog:
+    global _catalog
+    with _lock:
+        _catalog = load(db)
+        return _catalog
+
+
+def invalidate():
+    global _catalog
+    with _lock:
+        _catalog = None
+
+
+# another worker process changed the tables; reload on next use
+versions.on_change(["subsystems", "activities", "activity_dependencies"], invalidate)
+
+
+def get_catalog(db: Session) -> ReferenceCatalog:
+    catalog = _catalog
+    if catalog is None:
+        catalog = refresh(db)
+    return catalog
@@ -0,0 +1,350 @@
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+# Query-plan and query-count guardrail for the API hot paths. Seeds a
+# throwaway database with a medium dataset, calls every endpoint below
+# through the ASGI app and captures the SQL each request issues. A check
+# fails when a request issues more statements than its budget (per-row
+# queries) or when EXPLAIN QUERY PLAN shows a full SCAN of a large table the
+# endpoint is not expected to read in full. Exits 1 and prints the offending
+# SQL with its plan on failure.
+#
+#   python check_queries.py [--projects 500] [--progress 50000]
+
+_workdir = tempfile.mkdtemp(prefix="check_queries_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'check.db')}"
+# the checks call each endpoint back to back from one client
+for _name in ("REPORTS_BURST", "REPORTS_RATE_PER_SECOND", "INTERACTIVE_BURST", "INTERACTIVE_RATE_PER_SECOND"):
+    os.environ.setdefault(_name, "100000")
+# a relationship the query did not eager-load raises, so the request fails
+# the check instead of hiding a lazy SELECT per row
+os.environ.setdefault("STRICT_LOADING", "1")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+
+import main as app_module
+import models, catalog, audit
+from database import SessionLocal, engine
+
+# Tables that grow with usage; small reference tables may always be scanned
+LARGE_TABLES = {"projects", "project_progress", "project_progress_archive", "project_subsystem_mappings", "users", "audit_log"}
+
+SCAN_PATTERN = re.compile(r"^SCAN (\w+)")
+# plans name aliased tables by their alias
+ALIAS_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", re.IGNORECASE)
+
+
+class Check:
+    def __init__(self, name: str, method: str, path: str, role: str, max_statements: int,
+                 allow_scans: Tuple[str, ...] = (), json=None, params=None, files=None, warmup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.role = role
+        self.max_statements = max_statements
+        self.allow_scans = set(allow_scans)
+        self.json = json
+        self.params = params
+        self.files = files
+        # overrides for the warm-up call; writes need their own, or the
+        # measured call repeats the warm-up and changes nothing
+        self.warmup = warmup or {}
+
+
+def progress_csv(project_id: str, subsystem_id: str, activity_ids: List[str], status: str) -> dict:
+    lines = ["project_id,subsystem_id,activity_id,status"]
+    lines.extend(f"{project_id},{subsystem_id},{activity_id},{status}" for activity_id in activity_ids)
+    return {"file": ("progress.csv", "\n".join(lines), "text/csv")}
+
+
+def build_checks(ids: dict) -> List[Check]:
+    project_id = ids["project_id"]
+    progress = {"project_id": project_id, "subsystem_id": ids["subsystem_id"], "activity_id": ids["activity_id"]}
+    spare = ids["spare"]
+    return [
+        Check("list users", "GET", "/api/users", "ADMIN", 1, allow_scans=("users",)),
+        Check("list projects", "GET", "/api/projects", "PM", 1, allow_scans=("projects",)),
+        Check("list subsystems", "GET", "/api/subsystems", "PM", 0),
+        Check("list activities", "GET", "/api/activities", "PM", 0),
+        Check("activities by type", "GET", "/api/activities", "PM", 0,
+              params={"activity_type": "FPGA", "associated_with": "PROJECT"}),
+        Check("list dependencies", "GET", "/api/activity-dependencies", "PM", 0),
+        Check("list mappings", "GET", "/api/project-subsystem-mappings", "PM", 1,
+              allow_scans=("project_subsystem_mappings",)),
+        Check("own progress", "GET", "/api/project-progress", "ENGINEER", 1),
+        Check("all progress", "GET", "/api/project-progress", "PM", 1, allow_scans=("project_progress",)),
+        Check("bootstrap", "GET", "/api/bootstrap", "ADMIN", 5,
+              allow_scans=("users", "projects", "project_subsystem_mappings", "project_progress")),
+        Check("bootstrap, engineer", "GET", "/api/bootstrap", "ENGINEER", 4,
+              allow_scans=("projects", "project_subsystem_mappings")),
+        Check("update progress", "POST", "/api/project-progress", "ENGINEER", 5,
+              json=dict(progress, status="COMPLETED", notes="checked"),
+              warmup={"json": dict(progress, status="IN_PROGRESS")}),
+        Check("create progress", "POST", "/api/project-progress", "ENGINEER", 5,
+              json=dict(progress, project_id=ids["empty_project_id"], activity_id=ids["activity_ids"][1], status="IN_PROGRESS"),
+              warmup={"json": dict(progress, project_id=ids["empty_project_id"], status="IN_PROGRESS")}),
+        Check("update project", "PUT", f"/api/projects/{project_id}", "PM", 4,
+              json={"description": "checked"}, warmup={"json": {"description": "warm-up"}}),
+        Check("create project", "POST", "/api/projects", "PM", 4,
+              json={"project_name": "Checked project", "program_type": "FPGA"},
+              warmup={"json": {"project_name": "Warm-up project", "program_type": "FPGA"}}),
+        Check("create mapping", "POST", "/api/project-subsystem-mappings", "PM", 5,
+              json={"project_id": project_id, "subsystem_id": ids["subsystem_ids"][2]},
+              warmup={"json": {"project_id": project_id, "subsystem_id": ids["subsystem_ids"][1]}}),
+        Check("import progress", "POST", "/api/import/project-progress", "ENGINEER", 12,
+              allow_scans=("projects", "users"),
+              files=progress_csv(project_id, ids["subsystem_id"], ids["activity_ids"], "COMPLETED"),
+              warmup={"files": progress_csv(project_id, ids["subsystem_id"], ids["activity_ids"], "IN_PROGRESS")}),
+        Check("archive closed projects", "POST", "/api/archive/run", "ADMIN", 1, allow_scans=("projects",)),
+        Check("audit log", "GET", "/api/audit", "ADMIN", 1, allow_scans=("audit_log",)),
+        Check("audit log, one entity", "GET", "/api/audit", "ADMIN", 1,
+              params={"entity": "projects", "entity_id": project_id}),
+        Check("search", "GET", "/api/search", "ENGINEER", 1, params={"q": "Project 1"}),
+        Check("project report", "POST", "/api/reports/project-activity", "PM", 2,
+              allow_scans=("projects", "project_progress"), json={}),
+        Check("subsystem report", "POST", "/api/reports/subsystem-activity", "PM", 1,
+              allow_scans=("project_progress",), json={}),
+        Check("gantt report", "POST", "/api/reports/gantt", "PM", 1,
+              allow_scans=("project_progress",), json={}),
+        Check("gantt report, one project", "POST", "/api/reports/gantt", "PM", 1,
+              json={"project_ids": [project_id]}),
+        Check("schedule report", "POST", "/api/reports/schedule", "PM", 1,
+              allow_scans=("projects",), json={}),
+        Check("schedule report, one project", "POST", "/api/reports/schedule", "PM", 1,
+              json={"project_ids": [project_id]}),
+        # deletes last, each call on its own spare rows
+        Check("delete project", "DELETE", f"/api/projects/{spare['projects'][1]}", "ADMIN", 9,
+              warmup={"path": f"/api/projects/{spare['projects'][0]}"}),
+        Check("bulk delete projects", "POST", "/api/projects/bulk-delete", "ADMIN", 8,
+              json={"ids": spare["projects"][4:6]}, warmup={"json": {"ids": spare["projects"][2:4]}}),
+        Check("delete user", "DELETE", f"/api/users/{spare['users'][1]}", "ADMIN", 11,
+              warmup={"path": f"/api/users/{spare['users'][0]}"}),
+        Check("bulk delete users", "POST", "/api/users/bulk-delete", "ADMIN", 10,
+              json={"ids": spare["users"][4:6]}, warmup={"json": {"ids": spare["users"][2:4]}}),
+        Check("delete subsystem", "DELETE", f"/api/subsystems/{spare['subsystems'][1]}", "ADMIN", 12,
+              warmup={"path": f"/api/subsystems/{spare['subsystems'][0]}"}),
+        Check("delete activity", "DELETE", f"/api/activities/{spare['activities'][1]}", "ADMIN", 13,
+              warmup={"path": f"/api/activities/{spare['activities'][0]}"}),
+    ]
+
+
+USERS = {
+    "ADMIN": ("admin", "admin123"),
+    "PM": ("pm1", "pm123"),
+    "DPD": ("dpd1", "dpd123"),
+    "ENGINEER": ("eng1", "eng123"),
+}
+
+
+def seed(projects: int, progress: int) -> dict:
+    app_module.ensure_schema()
+    app_module.search.create_search_indexes(engine)
+    app_module.seed_defaults()
+    db = SessionLocal()
+    try:
+        reference = catalog.get_catalog(db)
+        owner = db.query(models.User).filter(models.User.username == "pm1").one()
+        template = db.query(models.User).filter(models.User.username == "eng1").one()
+        engineers = [template.user_id]
+        user_rows = []
+        for i in range(50):
+            user_id = str(uuid.uuid4())
+            engineers.append(user_id)
+            user_rows.append({"user_id": user_id, "username": f"engineer{i}", "password": template.password,
+                              "role": models.UserRole.ENGINEER})
+        db.execute(insert(models.User), user_rows)
+
+        # spare subsystems and activities for the delete checks
+        spare_subsystems = [
+            {"subsystem_id": str(uuid.uuid4()), "subsystem_name": f"Spare subsystem {i}"} for i in range(2)
+        ]
+        spare_activities = [
+            {"activity_id": str(uuid.uuid4()), "activity_name": f"Spare activity {i}",
+             "activity_type": models.ActivityType.FPGA, "associated_with": models.AssociatedWith.PROJECT}
+            for i in range(2)
+        ]
+        db.execute(insert(models.Subsystem), spare_subsystems)
+        db.execute(insert(models.Activity), spare_activities)
+
+        rng = random.Random(7)
+        project_rows = [
+            {"project_id": str(uuid.uuid4()), "project_name": f"Project {i}", "program_type": rng.choice(["FPGA", "PROCESSOR"]),
+             "description": f"Checked project {i}", "created_by": owner.user_id}
+            for i in range(projects)
+        ]
+        db.execute(insert(models.Project), project_rows)
+        subsystem_ids = list(reference.subsystems_by_id)
+        subsystem_ids.extend(row["subsystem_id"] for row in spare_subsystems)
+        db.execute(insert(models.ProjectSubsystemMapping), [
+            {"mapping_id": str(uuid.uuid4()), "project_id": row["project_id"], "subsystem_id": rng.choice(subsystem_ids),
+             "assigned_by": owner.user_id}
+            for row in project_rows
+        ])
+
+        activity_ids = list(reference.activities_by_id)
+        activity_ids.extend(row["activity_id"] for row in spare_activities)
+        statuses = list(models.ProgressStatus)
+        today = date.today()
+        progress_rows = []
+        for i in range(progress):
+            status = rng.choice(statuses)
+            start = today - timedelta(days=rng.randint(1, 300))
+            progress_rows.append({
+                "progress_id": str(uuid.uuid4()),
+                "project_id": rng.choice(project_rows[:-1])["project_id"],
+                "subsystem_id": rng.choice(subsystem_ids),
+                "activity_id": rng.choice(activity_ids),
+                "user_id": rng.choice(engineers),
+                "status": status,
+                "start_date": start if status != models.ProgressStatus.NOT_STARTED else None,
+                "completion_date": start + timedelta(days=rng.randint(1, 60)) if status == models.ProgressStatus.COMPLETED else None,
+                "notes": f"note {i}",
+            })
+        db.execute(insert(models.ProjectProgress), progress_rows)
+        app_module.versions.bump(db, "users", "projects", "subsystems", "activities",
+                                 "project_subsystem_mappings", "project_progress")
+        db.commit()
+        catalog.refresh(db)
+        audit.buffer.flush()
+        return {
+            "project_id": project_rows[0]["project_id"],
+            # has no progress, so writes to it take the insert path
+            "empty_project_id": project_rows[-1]["project_id"],
+            "subsystem_id": subsystem_ids[0],
+            "activity_id": activity_ids[0],
+            "subsystem_ids": subsystem_ids[:3],
+            "activity_ids": activity_ids[:10],
+            "spare": {
+                "projects": [row["project_id"] for row in project_rows[1:7]],
+                "users": [row["user_id"] for row in user_rows[-6:]],
+                "subsystems": [row["subsystem_id"] for row in spare_subsystems],
+                "activities": [row["activity_id"] for row in spare_activities],
+            },
+        }
+    finally:
+        db.close()
+
+
+class StatementCapture:
+    def __init__(self):
+        self.statements = []
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            if executemany:
+                parameters = parameters[0] if parameters else ()
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        self.active = True
+        return self
+
+    def __exit__(self, *exc):
+        self.active = False
+
+
+def query_plan(statement: str, parameters) -> List[str]:
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")):
+        return []
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        raw.close()
+
+
+def full_scans(statement: str, plan: List[str]) -> List[str]:
+    aliases = {alias: table for table, alias in ALIAS_PATTERN.findall(statement)}
+    tables = []
+    for detail in plan:
+        match = SCAN_PATTERN.match(detail)
+        if match:
+            table = aliases.get(match.group(1), match.group(1))
+            if table in LARGE_TABLES:
+                tables.append(table)
+    return tables
+
+
+def run_check(client: TestClient, capture: StatementCapture, headers: dict, check: Check) -> Optional[str]:
+    measured = {"path": check.path, "json": check.json, "params": check.params, "files": check.files}
+    warmup = dict(measured, **check.warmup)
+    request = lambda path, **kwargs: client.request(check.method, path, headers=headers[check.role], **kwargs)
+    # the first call fills the process-local caches; the budget applies to the steady state
+    try:
+        response = request(**warmup)
+        if response.status_code >= 400:
+            return f"HTTP {response.status_code}: {response.text[:200]}"
+        with capture:
+            response = request(**measured)
+    except Exception as error:
+        # e.g. a lazy load under STRICT_LOADING
+        return f"{type(error).__name__}: {str(error)[:200]}"
+    if response.status_code >= 400:
+        return f"HTTP {response.status_code}: {response.text[:200]}"
+
+    problems = []
+    if len(capture.statements) > check.max_statements:
+        problems.append(f"{len(capture.statements)} statements, budget is {check.max_statements}")
+    for statement, parameters in capture.statements:
+        plan = query_plan(statement, parameters)
+        scanned = [table for table in full_scans(statement, plan) if table not in check.allow_scans]
+        if scanned:
+            problems.append(f"full scan of {', '.join(sorted(set(scanned)))}")
+    if not problems:
+        return None
+    lines = ["; ".join(problems)]
+    for number, (statement, parameters) in enumerate(capture.statements, start=1):
+        lines.append(f"  [{number}] {' '.join(statement.split())}")
+        for detail in query_plan(statement, parameters):
+            lines.append(f"        {detail}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check statement counts and query plans of the API endpoints")
+    parser.add_argument("--projects", type=int, default=500)
+    parser.add_argument("--progress", type=int, default=50000)
+    parser.add_argument("-k", dest="only", help="only run checks whose name contains this text")
+    args = parser.parse_args(argv)
+
+    try:
+        ids = seed(args.projects, args.progress)
+        client = TestClient(app_module.app)
+        headers = {}
+        for role, (username, password) in USERS.items():
+            response = client.post("/api/auth/login", json={"username": username, "password": password, "role": role})
+            headers[role] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        capture = StatementCapture()
+        failed = 0
+        for check in build_checks(ids):
+            if args.only and args.only not in check.name:
+                continue
+            error = run_check(client, capture, headers, check)
+            if error:
+                failed += 1
+                print(f"FAIL {check.name} ({check.method} {check.path}): {error}")
+            else:
+                print(f"ok   {check.name} ({len(capture.statements)} statements)")
+    finally:
+        engine.dispose()
+        shutil.rmtree(_workdir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+# Correctness guardrail for the incremental schedule updates. Seeds a
+# throwaway database, caches every project's schedule, then replays random
+# progress writes through crud. After each write the cached schedule (updated
+# by schedule.progress_changed) is compared with a full recompute from the
+# database. Exits 1 and prints the first differing activities on a mismatch.
+#
+#   python check_schedule.py [--projects 20] [--progress 2000] [--writes 300]
+
+_workdir = tempfile.mkdtemp(prefix="check_schedule_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'check.db')}"
+
+from sqlalchemy import insert
+
+import main as app_module
+import models, schemas, catalog, crud, schedule
+from database import SessionLocal, engine
+
+STATUSES = [status.value for status in models.ProgressStatus]
+
+
+def seed(db, rng: random.Random, projects: int, progress: int) -> dict:
+    app_module.ensure_schema()
+    app_module.seed_defaults()
+    reference = catalog.get_catalog(db)
+    owner = db.query(models.User).filter(models.User.username == "pm1").one()
+    user_ids = [user.user_id for user in db.query(models.User)]
+    project_rows = [
+        {"project_id": str(uuid.uuid4()), "project_name": f"Project {i}", "program_type": rng.choice(["FPGA", "PROCESSOR"]),
+         "created_by": owner.user_id}
+        for i in range(projects)
+    ]
+    db.execute(insert(models.Project), project_rows)
+    subsystem_ids = list(reference.subsystems_by_id)
+    activity_ids = list(reference.activities_by_id)
+    today = date.today()
+    progress_rows = []
+    for _ in range(progress):
+        status = rng.choice(STATUSES)
+        start = today - timedelta(days=rng.randint(5, 200))
+        progress_rows.append({
+            "progress_id": str(uuid.uuid4()),
+            "project_id": rng.choice(project_rows)["project_id"],
+            "subsystem_id": rng.choice(subsystem_ids),
+            "activity_id": rng.choice(activity_ids),
+            "user_id": rng.choice(user_ids),
+            "status": status,
+            "start_date": start if status != models.ProgressStatus.NOT_STARTED.value else None,
+            "completion_date": start + timedelta(days=rng.randint(1, 40)) if status == models.ProgressStatus.COMPLETED.value else None,
+        })
+    db.execute(insert(models.ProjectProgress), progress_rows)
+    app_module.versions.bump(db, "projects", "project_progress")
+    db.commit()
+    return {
+        "project_ids": [row["project_id"] for row in project_rows],
+        "subsystem_ids": subsystem_ids,
+        "activity_ids": activity_ids,
+        "user_ids": user_ids,
+    }
+
+
+def snapshot(db) -> dict:
+    projects = db.query(models.Project).order_by(models.Project.project_name).all()
+    reference = catalog.get_catalog(db)
+    result = {}
+    for project_schedule in schedule.get_schedules(db, projects):
+        nodes = [
+            tuple(getattr(project_schedule.nodes[activity_id], name) for name in schedule.ScheduleNode.__slots__)
+            for activity_id in project_schedule.order
+        ]
+        bars = [bar.model_dump() for bar in project_schedule.bars(reference)]
+        result[project_schedule.project_id] = (project_schedule.finish, nodes, bars)
+    return result
+
+
+def differences(incremental: dict, full: dict) -> list:
+    lines = []
+    for project_id, (finish, nodes, bars) in full.items():
+        cached_finish, cached_nodes, cached_bars = incremental.get(project_id, (None, [], []))
+        if cached_finish != finish:
+            lines.append(f"  {project_id}: finish {cached_finish} incremental, {finish} full")
+        for cached, node in zip(cached_nodes, nodes):
+            if cached != node:
+                lines.append(f"  {project_id}: incremental {cached}\n  {' ' * len(project_id)}  full        {node}")
+        if len(cached_nodes) != len(nodes):
+            lines.append(f"  {project_id}: {len(cached_nodes)} activities incremental, {len(nodes)} full")
+        if cached_bars != bars:
+            lines.append(f"  {project_id}: bars differ")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare incremental schedule updates with full recomputes")
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--progress", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        ids = seed(db, rng, args.projects, args.progress)
+        snapshot(db)
+        incremental_updates = 0
+        for write in range(1, args.writes + 1):
+            project_id = rng.choice(ids["project_ids"])
+            cached = schedule._schedules.get(project_id)
+            progress = schemas.ProjectProgressCreate(
+                project_id=project_id,
+                subsystem_id=rng.choice(ids["subsystem_ids"]),
+                activity_id=rng.choice(ids["activity_ids"]),
+                status=rng.choice(STATUSES),
+            )
+            crud.create_or_update_project_progress(db, progress, rng.choice(ids["user_ids"]))
+            # the write was applied to the cached schedule rather than dropping it
+            if cached is not None and schedule._schedules.get(project_id) is cached:
+                incremental_updates += 1
+            incremental = snapshot(db)
+            schedule.invalidate_all()
+            full = snapshot(db)
+            lines = differences(incremental, full)
+            if lines:
+                print(f"FAIL write {write} ({progress.status.value} of {progress.activity_id} in {project_id}):")
+                print("\n".join(lines[:20]))
+                return 1
+        print(f"ok   {args.writes} writes, {incremental_updates} applied incrementally, no mismatches")
+        return 0
+    finally:
+        db.close()
+        engine.dispose()
+        shutil.rmtree(_workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
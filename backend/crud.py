@@ -1,18 +1,47 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-import models, schemas
+from sqlalchemy.orm import Session, joinedload, raiseload
+from sqlalchemy import and_, delete, select
+import models, schemas, catalog, versions, revocation, schedule, audit, archive
 from datetime import datetime, date
+from typing import List, Optional
 import uuid
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Ids per IN (...) list in set-based deletes, well below SQLite's parameter limit
+DELETE_CHUNK_SIZE = 500
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+# Set-based cascading delete: removes the rows referencing the given ids with
+# one DELETE per dependent column and chunk instead of loading children
+# through the ORM. The caller commits, so everything is one transaction.
+# Returns the deleted rows (column values) for the audit log.
+def _delete_with_dependents(db: Session, key, dependent_columns, ids: List[str]):
+    ids = list(dict.fromkeys(ids))
+    table = key.class_.__table__
+    rows = []
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        rows.extend(dict(row) for row in db.execute(select(table).where(key.in_(chunk))).mappings())
+    existing = [row[key.name] for row in rows]
+    for start in range(0, len(existing), DELETE_CHUNK_SIZE):
+        chunk = existing[start:start + DELETE_CHUNK_SIZE]
+        for column in dependent_columns:
+            db.execute(delete(column.class_).where(column.in_(chunk)), execution_options={"synchronize_session": False})
+        db.execute(delete(key.class_).where(key.in_(chunk)), execution_options={"synchronize_session": False})
+    return rows
+
+# Logs the rows returned by _delete_with_dependents and returns their ids
+def _record_deletes(key, rows):
+    for row in rows:
+        audit.record(key.class_.__tablename__, row[key.name], "delete", before=audit.snapshot(row))
+    return [row[key.name] for row in rows]
+
 # User CRUD
 def get_user(db: Session, user_id: str):
     return db.query(models.User).filter(models.User.user_id == user_id).first()
@@ -32,29 +61,67 @@ def create_user(db: Session, user: schemas.UserCreate):
         role=user.role
     )
     db.add(db_user)
+    versions.bump(db, "users")
     db.commit()
     db.refresh(db_user)
+    audit.record("users", db_user.user_id, "create", after=audit.snapshot(db_user))
     return db_user
 
 def update_user(db: Session, user_id: str, user_update: schemas.UserUpdate):
     db_user = get_user(db, user_id)
     if db_user:
+        before = audit.snapshot(db_user)
         update_data = user_update.dict(exclude_unset=True)
         if "password" in update_data:
             update_data["password"] = get_password_hash(update_data["password"])
         for field, value in update_data.items():
             setattr(db_user, field, value)
+        versions.bump(db, "users")
         db.commit()
+        # tokens carry username and role, so outstanding ones are now stale
+        revocation.revoke_user(user_id)
         db.refresh(db_user)
+        after = audit.snapshot(db_user)
+        if "password" in update_data:
+            # the hash itself is never logged
+            after["password_changed"] = True
+        audit.record("users", user_id, "update", before=before, after=after)
     return db_user
 
 def delete_user(db: Session, user_id: str):
     db_user = get_user(db, user_id)
     if db_user:
-        db.delete(db_user)
-        db.commit()
+        delete_users(db, [user_id])
     return db_user
 
+def get_users_in_use(db: Session, user_ids: List[str]) -> List[str]:
+    # Users recorded as creator of a project or assigner of a mapping; those
+    # rows belong to the project, so such users cannot be deleted
+    ids = list(dict.fromkeys(user_ids))
+    in_use = set()
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        in_use.update(row[0] for row in db.execute(
+            select(models.Project.created_by).where(models.Project.created_by.in_(chunk)).union(
+                select(models.ProjectSubsystemMapping.assigned_by).where(models.ProjectSubsystemMapping.assigned_by.in_(chunk))
+            )
+        ))
+    return [user_id for user_id in ids if user_id in in_use]
+
+def delete_users(db: Session, user_ids: List[str]):
+    # Progress entries belong to the user and go with it; callers reject
+    # users still referenced by projects or mappings (get_users_in_use)
+    rows = _delete_with_dependents(db, models.User.user_id, [
+        models.ProjectProgress.user_id,
+        models.ProjectProgressArchive.user_id,
+    ], user_ids)
+    versions.bump(db, "users", "project_progress")
+    db.commit()
+    deleted = _record_deletes(models.User.user_id, rows)
+    schedule.invalidate_all()
+    revocation.revoke_users(deleted)
+    return deleted
+
 # Project CRUD
 def get_project(db: Session, project_id: str):
     return db.query(models.Project).filter(models.Project.project_id == project_id).first()
@@ -71,27 +138,53 @@ def create_project(db: Session, project: schemas.ProjectCreate, created_by: str)
         created_by=created_by
     )
     db.add(db_project)
+    versions.bump(db, "projects")
     db.commit()
     db.refresh(db_project)
+    audit.record("projects", db_project.project_id, "create", after=audit.snapshot(db_project))
     return db_project
 
 def update_project(db: Session, project_id: str, project_update: schemas.ProjectUpdate):
     db_project = get_project(db, project_id)
     if db_project:
+        before = audit.snapshot(db_project)
         update_data = project_update.dict(exclude_unset=True)
+        if "closed" in update_data:
+            closed = update_data.pop("closed")
+            if closed and not db_project.closed_at:
+                db_project.closed_at = datetime.utcnow()
+            elif closed is False and db_project.closed_at:
+                # reopening brings the archived progress back with it
+                db_project.closed_at = None
+                archive.restore_rows(db, project_id)
+                versions.bump(db, "project_progress")
         for field, value in update_data.items():
             setattr(db_project, field, value)
+        versions.bump(db, "projects")
         db.commit()
+        schedule.invalidate([project_id])
         db.refresh(db_project)
+        audit.record("projects", project_id, "update", before=before, after=audit.snapshot(db_project))
     return db_project
 
 def delete_project(db: Session, project_id: str):
     db_project = get_project(db, project_id)
     if db_project:
-        db.delete(db_project)
-        db.commit()
+        delete_projects(db, [project_id])
     return db_project
 
+def delete_projects(db: Session, project_ids: List[str]):
+    rows = _delete_with_dependents(db, models.Project.project_id, [
+        models.ProjectProgress.project_id,
+        models.ProjectProgressArchive.project_id,
+        models.ProjectSubsystemMapping.project_id,
+    ], project_ids)
+    versions.bump(db, "projects", "project_progress", "project_subsystem_mappings")
+    db.commit()
+    deleted = _record_deletes(models.Project.project_id, rows)
+    schedule.invalidate(deleted)
+    return deleted
+
 # Subsystem CRUD
 def get_subsystem(db: Session, subsystem_id: str):
     return db.query(models.Subsystem).filter(models.Subsystem.subsystem_id == subsystem_id).first()
@@ -106,27 +199,46 @@ def create_subsystem(db: Session, subsystem: schemas.SubsystemCreate):
         description=subsystem.description
     )
     db.add(db_subsystem)
+    versions.bump(db, "subsystems")
     db.commit()
     db.refresh(db_subsystem)
+    catalog.refresh(db)
+    audit.record("subsystems", db_subsystem.subsystem_id, "create", after=audit.snapshot(db_subsystem))
     return db_subsystem
 
 def update_subsystem(db: Session, subsystem_id: str, subsystem_update: schemas.SubsystemUpdate):
     db_subsystem = get_subsystem(db, subsystem_id)
     if db_subsystem:
+        before = audit.snapshot(db_subsystem)
         update_data = subsystem_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_subsystem, field, value)
+        versions.bump(db, "subsystems")
         db.commit()
         db.refresh(db_subsystem)
+        catalog.refresh(db)
+        audit.record("subsystems", subsystem_id, "update", before=before, after=audit.snapshot(db_subsystem))
     return db_subsystem
 
 def delete_subsystem(db: Session, subsystem_id: str):
     db_subsystem = get_subsystem(db, subsystem_id)
     if db_subsystem:
-        db.delete(db_subsystem)
-        db.commit()
+        delete_subsystems(db, [subsystem_id])
     return db_subsystem
 
+def delete_subsystems(db: Session, subsystem_ids: List[str]):
+    rows = _delete_with_dependents(db, models.Subsystem.subsystem_id, [
+        models.ProjectProgress.subsystem_id,
+        models.ProjectProgressArchive.subsystem_id,
+        models.ProjectSubsystemMapping.subsystem_id,
+    ], subsystem_ids)
+    versions.bump(db, "subsystems", "project_progress", "project_subsystem_mappings")
+    db.commit()
+    deleted = _record_deletes(models.Subsystem.subsystem_id, rows)
+    catalog.refresh(db)
+    schedule.invalidate_all()
+    return deleted
+
 # Activity CRUD
 def get_activity(db: Session, activity_id: str):
     return db.query(models.Activity).filter(models.Activity.activity_id == activity_id).first()
@@ -135,12 +247,7 @@ def get_activities(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Activity).offset(skip).limit(limit).all()
 
 def get_activities_by_type_and_association(db: Session, activity_type: str, associated_with: str):
-    return db.query(models.Activity).filter(
-        and_(
-            models.Activity.activity_type == activity_type,
-            models.Activity.associated_with == associated_with
-        )
-    ).all()
+    return catalog.get_catalog(db).activities_for(activity_type, associated_with)
 
 def create_activity(db: Session, activity: schemas.ActivityCreate):
     db_activity = models.Activity(
@@ -148,30 +255,105 @@ def create_activity(db: Session, activity: schemas.ActivityCreate):
         activity_name=activity.activity_name,
         activity_type=activity.activity_type,
         associated_with=activity.associated_with,
-        description=activity.description
+        description=activity.description,
+        estimated_duration_days=activity.estimated_duration_days
     )
     db.add(db_activity)
+    versions.bump(db, "activities")
     db.commit()
     db.refresh(db_activity)
+    catalog.refresh(db)
+    audit.record("activities", db_activity.activity_id, "create", after=audit.snapshot(db_activity))
     return db_activity
 
 def update_activity(db: Session, activity_id: str, activity_update: schemas.ActivityUpdate):
     db_activity = get_activity(db, activity_id)
     if db_activity:
+        before = audit.snapshot(db_activity)
         update_data = activity_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_activity, field, value)
+        versions.bump(db, "activities")
         db.commit()
         db.refresh(db_activity)
+        catalog.refresh(db)
+        schedule.invalidate_all()
+        audit.record("activities", activity_id, "update", before=before, after=audit.snapshot(db_activity))
     return db_activity
 
 def delete_activity(db: Session, activity_id: str):
     db_activity = get_activity(db, activity_id)
     if db_activity:
-        db.delete(db_activity)
-        db.commit()
+        delete_activities(db, [activity_id])
     return db_activity
 
+def delete_activities(db: Session, activity_ids: List[str]):
+    rows = _delete_with_dependents(db, models.Activity.activity_id, [
+        models.ProjectProgress.activity_id,
+        models.ProjectProgressArchive.activity_id,
+        models.ActivityDependency.activity_id,
+        models.ActivityDependency.depends_on_id,
+    ], activity_ids)
+    versions.bump(db, "activities", "project_progress", "activity_dependencies")
+    db.commit()
+    deleted = _record_deletes(models.Activity.activity_id, rows)
+    catalog.refresh(db)
+    schedule.invalidate_all()
+    return deleted
+
+# Activity Dependency CRUD
+def get_activity_dependency(db: Session, dependency_id: str):
+    return db.query(models.ActivityDependency).filter(models.ActivityDependency.dependency_id == dependency_id).first()
+
+def get_activity_dependency_by_pair(db: Session, activity_id: str, depends_on_id: str):
+    return db.query(models.ActivityDependency).filter(
+        models.ActivityDependency.activity_id == activity_id,
+        models.ActivityDependency.depends_on_id == depends_on_id
+    ).first()
+
+def get_activity_dependencies(db: Session):
+    return catalog.get_catalog(db).dependencies
+
+def creates_dependency_cycle(db: Session, activity_id: str, depends_on_id: str):
+    # true when depends_on_id already (transitively) depends on activity_id
+    predecessors = catalog.get_catalog(db).predecessors
+    stack, seen = [depends_on_id], set()
+    while stack:
+        current = stack.pop()
+        if current == activity_id:
+            return True
+        if current not in seen:
+            seen.add(current)
+            stack.extend(predecessors.get(current, ()))
+    return False
+
+def create_activity_dependency(db: Session, dependency: schemas.ActivityDependencyCreate):
+    db_dependency = models.ActivityDependency(
+        dependency_id=str(uuid.uuid4()),
+        activity_id=dependency.activity_id,
+        depends_on_id=dependency.depends_on_id
+    )
+    db.add(db_dependency)
+    versions.bump(db, "activity_dependencies")
+    db.commit()
+    db.refresh(db_dependency)
+    catalog.refresh(db)
+    schedule.invalidate_all()
+    audit.record("activity_dependencies", db_dependency.dependency_id, "create", after=audit.snapshot(db_dependency))
+    return db_dependency
+
+def delete_activity_dependency(db: Session, dependency_id: str):
+    db_dependency = get_activity_dependency(db, dependency_id)
+    if db_dependency:
+        before = audit.snapshot(db_dependency)
+        db.delete(db_dependency)
+        versions.bump(db, "activity_dependencies")
+        db.commit()
+        catalog.refresh(db)
+        schedule.invalidate_all()
+        audit.record("activity_dependencies", dependency_id, "delete", before=before)
+    return db_dependency
+
 # Project Subsystem Mapping CRUD
 def get_project_subsystem_mapping(db: Session, project_id: str):
     return db.query(models.ProjectSubsystemMapping).filter(
@@ -179,13 +361,16 @@ def get_project_subsystem_mapping(db: Session, project_id: str):
     ).first()
 
 def get_project_subsystem_mappings(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.ProjectSubsystemMapping).offset(skip).limit(limit).all()
+    return db.query(models.ProjectSubsystemMapping).options(raiseload("*")).offset(skip).limit(limit).all()
 
 def create_project_subsystem_mapping(db: Session, mapping: schemas.ProjectSubsystemMappingCreate, assigned_by: str):
     # Delete existing mapping if exists
     existing = get_project_subsystem_mapping(db, mapping.project_id)
+    replaced = audit.snapshot(existing) if existing else None
     if existing:
         db.delete(existing)
+        # project_id is unique and the flush would insert before it deletes
+        db.flush()
     
     db_mapping = models.ProjectSubsystemMapping(
         mapping_id=str(uuid.uuid4()),
@@ -194,8 +379,12 @@ def create_project_subsystem_mapping(db: Session, mapping: schemas.ProjectSubsys
         assigned_by=assigned_by
     )
     db.add(db_mapping)
+    versions.bump(db, "project_subsystem_mappings")
     db.commit()
     db.refresh(db_mapping)
+    if replaced:
+        audit.record("project_subsystem_mappings", replaced["mapping_id"], "delete", before=replaced)
+    audit.record("project_subsystem_mappings", db_mapping.mapping_id, "create", after=audit.snapshot(db_mapping))
     return db_mapping
 
 # Project Progress CRUD
@@ -210,16 +399,40 @@ def get_project_progress(db: Session, project_id: str, subsystem_id: str, activi
     ).first()
 
 def get_project_progress_by_user(db: Session, user_id: str):
-    return db.query(models.ProjectProgress).filter(models.ProjectProgress.user_id == user_id).all()
+    return db.query(models.ProjectProgress).options(raiseload("*")).filter(models.ProjectProgress.user_id == user_id).all()
 
 def get_all_project_progress(db: Session, skip: int = 0, limit: int = 1000):
-    return db.query(models.ProjectProgress).offset(skip).limit(limit).all()
+    return db.query(models.ProjectProgress).options(raiseload("*")).offset(skip).limit(limit).all()
+
+def get_archived_project_progress(db: Session, project_ids: Optional[List[str]] = None):
+    query = db.query(models.ProjectProgressArchive).options(raiseload("*"))
+    if project_ids:
+        query = query.filter(models.ProjectProgressArchive.project_id.in_(project_ids))
+    return query.all()
+
+def get_completed_project_progress(db: Session, project_ids: Optional[List[str]] = None, include_archived: bool = False):
+    # Gantt rows need the project name; subsystem and activity names come from the catalog
+    tables = [models.ProjectProgress, models.ProjectProgressArchive] if include_archived else [models.ProjectProgress]
+    rows = []
+    for table in tables:
+        query = db.query(table).options(
+            joinedload(table.project), raiseload("*")
+        ).filter(
+            table.status == models.ProgressStatus.COMPLETED,
+            table.start_date.isnot(None),
+            table.completion_date.isnot(None)
+        )
+        if project_ids:
+            query = query.filter(table.project_id.in_(project_ids))
+        rows.extend(query.all())
+    return rows
 
 def create_or_update_project_progress(db: Session, progress: schemas.ProjectProgressCreate, user_id: str):
     existing = get_project_progress(db, progress.project_id, progress.subsystem_id, progress.activity_id, user_id)
     
     if existing:
         # Update existing progress
+        before = audit.snapshot(existing)
         existing.status = progress.status
         existing.notes = progress.notes
         
@@ -229,8 +442,11 @@ def create_or_update_project_progress(db: Session, progress: schemas.ProjectProg
         elif progress.status == models.ProgressStatus.COMPLETED and not existing.completion_date:
             existing.completion_date = date.today()
         
+        versions.bump(db, "project_progress")
         db.commit()
+        schedule.progress_changed(db, progress.project_id, progress.activity_id)
         db.refresh(existing)
+        audit.record("project_progress", existing.progress_id, "update", before=before, after=audit.snapshot(existing))
         return existing
     else:
         # Create new progress
@@ -251,10 +467,28 @@ def create_or_update_project_progress(db: Session, progress: schemas.ProjectProg
             db_progress.completion_date = date.today()
         
         db.add(db_progress)
+        versions.bump(db, "project_progress")
         db.commit()
+        schedule.progress_changed(db, progress.project_id, progress.activity_id)
         db.refresh(db_progress)
+        audit.record("project_progress", db_progress.progress_id, "create", after=audit.snapshot(db_progress))
         return db_progress
 
+# Audit log
+def get_audit_log(db: Session, entity: Optional[str] = None, entity_id: Optional[str] = None,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  skip: int = 0, limit: int = 100):
+    query = db.query(models.AuditLog)
+    if entity:
+        query = query.filter(models.AuditLog.entity == entity)
+    if entity_id:
+        query = query.filter(models.AuditLog.entity_id == entity_id)
+    if since:
+        query = query.filter(models.AuditLog.created_at >= since)
+    if until:
+        query = query.filter(models.AuditLog.created_at < until)
+    return query.order_by(models.AuditLog.created_at.desc(), models.AuditLog.audit_id.desc()).offset(skip).limit(limit).all()
+
 # Authentication
 def authenticate_user(db: Session, username: str, password: str, role: str):
     user = get_user_by_username(db, username)
@@ -1,16 +1,70 @@
+import os
 import sqlite3
-from sqlalchemy import create_engine
+from datetime import datetime
+from sqlalchemy import create_engine, event, func, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import sessionmaker
-from models import Base
+from models import Base, CacheVersion, KEY_STORAGE
 
 # SQLite database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./project_management.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./project_management.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# WAL lets readers in other worker processes proceed while one process writes
+@event.listens_for(engine, "connect")
+def configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+# Create tables, plus the nullable columns and indexes added to existing
+# tables since the database was first created (create_all skips those)
+def ensure_schema():
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        check_key_storage(conn)
+        for table in Base.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+        seed_cache_versions(conn)
+
+# Keys stored in the other format never match a lookup, so a KEY_STORAGE
+# that does not fit the database would make every request miss silently
+def check_key_storage(conn):
+    stored = conn.execute(text("SELECT typeof(user_id) FROM users LIMIT 1")).scalar()
+    if stored is not None and stored != KEY_STORAGE:
+        raise RuntimeError(
+            f"KEY_STORAGE is {KEY_STORAGE!r} but the database stores {stored} keys; "
+            f"convert it with migrate_keys.py or set KEY_STORAGE={stored}"
+        )
+
+# A table without a cache_versions row starts at the time of its newest row,
+# so Last-Modified is a real timestamp before the first write after upgrading
+def seed_cache_versions(conn):
+    versions_table = CacheVersion.__table__
+    seeded = set(conn.execute(select(versions_table.c.name)).scalars())
+    for table in Base.metadata.sorted_tables:
+        if table.name in seeded or table.name in ("cache_versions", "audit_log"):
+            continue
+        timestamps = [table.c[name] for name in ("updated_at", "created_at") if name in table.c]
+        latest = conn.execute(select(func.max(timestamps[0]))).scalar() if timestamps else None
+        conn.execute(insert(versions_table).values(
+            name=table.name, version=1, updated_at=latest or datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=[versions_table.c.name]))
+
 # Database dependency
 def get_db():
     db = SessionLocal()
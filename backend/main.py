@@ -1,19 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Response, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import csv
 from datetime import datetime, timedelta, date
+import time
+import uuid
 import jwt
 from jwt import InvalidTokenError, DecodeError, ExpiredSignatureError
-import crud, models, schemas
-from database import SessionLocal, engine, get_db
+import crud, models, schemas, bulk_import, catalog, versions, search, archive, admission, revocation, schedule, audit
+from database import SessionLocal, engine, get_db, ensure_schema
 
 # Create tables
-models.Base.metadata.create_all(bind=engine)
+ensure_schema()
+search.create_search_indexes(engine)
 
 app = FastAPI(title="Project Management API", version="1.0.0")
 
+# Admission control; registered before CORS so rejections still carry CORS headers
+def token_subject(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            return jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except InvalidTokenError:
+            pass
+    return None
+
+def request_identity(request: Request) -> str:
+    if request.state.user_id:
+        return request.state.user_id
+    return request.client.host if request.client else "anonymous"
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    request.state.user_id = token_subject(request)
+    # crud writes made while serving the request are audited as this user;
+    # get_current_user still rejects the request if the token is not valid
+    audit.actor.set(request.state.user_id)
+    return await admission.dispatch(request, call_next, request_identity)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -21,47 +48,104 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
 # JWT settings
 SECRET_KEY = "your-secret-key-here"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = revocation.REFRESH_TOKEN_EXPIRE_DAYS
 
 security = HTTPBearer()
 
+archive_worker = archive.ArchiveWorker(SessionLocal)
+audit_writer = audit.AuditWriter()
+version_poller = versions.VersionPoller()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # iat keeps sub-second precision so revocation can compare against it
+    to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def create_tokens(user: models.User):
+    access_token = create_access_token(
+        data={"sub": user.user_id, "username": user.username, "role": user.role, "type": "access"},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = create_access_token(
+        data={"sub": user.user_id, "type": "refresh"},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    return {
+        "user": user,
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+def decode_token(token: str, token_type: str) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except (InvalidTokenError, DecodeError, ExpiredSignatureError):
         raise credentials_exception
-    
-    user = crud.get_user(db, user_id=user_id)
-    if user is None:
+    if payload.get("type") != token_type or payload.get("sub") is None or payload.get("jti") is None:
+        raise credentials_exception
+    if revocation.is_revoked(payload):
         raise credentials_exception
-    return user
+    return payload
+
+# The authenticated caller, built from verified token claims without a
+# database round trip
+class TokenUser:
+    __slots__ = ("user_id", "username", "role", "jti", "expires_at")
+
+    def __init__(self, payload: dict):
+        self.user_id = payload["sub"]
+        self.username = payload.get("username")
+        self.role = payload.get("role")
+        self.jti = payload["jti"]
+        self.expires_at = payload["exp"]
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = decode_token(credentials.credentials, "access")
+    if payload.get("role") not in [role.value for role in models.UserRole]:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return TokenUser(payload)
+
+def conditional_response(request: Request, response: Response, *tables: str):
+    # Returns a 304 response when the client's ETag is still current, otherwise
+    # sets the validators on the outgoing response and returns None
+    headers = {
+        "ETag": versions.etag(tables, request.url.query),
+        "Last-Modified": versions.last_modified(tables),
+        "Cache-Control": "no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_etags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in client_etags or headers["ETag"] in client_etags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
 
 # Initialize database with default data
-@app.on_event("startup")
-async def startup_event():
+def seed_defaults():
     db = SessionLocal()
     try:
         # Create default users if they don't exist
@@ -142,10 +226,40 @@ async def startup_event():
                 activity_create = schemas.ActivityCreate(**activity_data)
                 crud.create_activity(db, activity_create)
         
+        # Create default activity dependencies: (activity_type, activity, activity it depends on)
+        default_dependencies = [
+            ("FPGA", ("CDR", "PROJECT"), ("PDR", "PROJECT")),
+            ("FPGA", ("FRR", "SUBSYSTEM"), ("CDR", "PROJECT")),
+            ("FPGA", ("SDR", "SUBSYSTEM"), ("SRR", "SUBSYSTEM")),
+            ("PROCESSOR", ("CDR", "PROJECT"), ("PDR", "PROJECT")),
+            ("PROCESSOR", ("FDR", "SUBSYSTEM"), ("FRS", "SUBSYSTEM")),
+        ]
+        
+        reference = catalog.get_catalog(db)
+        for activity_type, (name, associated_with), (depends_on_name, depends_on_association) in default_dependencies:
+            activity = next((a for a in reference.activities_for(activity_type, associated_with) if a.activity_name == name), None)
+            depends_on = next((a for a in reference.activities_for(activity_type, depends_on_association) if a.activity_name == depends_on_name), None)
+            if activity and depends_on and not crud.get_activity_dependency_by_pair(db, activity.activity_id, depends_on.activity_id):
+                dependency_create = schemas.ActivityDependencyCreate(activity_id=activity.activity_id, depends_on_id=depends_on.activity_id)
+                crud.create_activity_dependency(db, dependency_create)
+        
         db.commit()
     finally:
         db.close()
 
+@app.on_event("startup")
+async def startup_event():
+    seed_defaults()
+    version_poller.start()
+    archive_worker.start()
+    audit_writer.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    archive_worker.stop()
+    audit_writer.stop()
+    version_poller.stop()
+
 # Authentication endpoints
 @app.post("/api/auth/login", response_model=schemas.LoginResponse)
 def login(login_request: schemas.LoginRequest, db: Session = Depends(get_db)):
@@ -156,26 +270,44 @@ def login(login_request: schemas.LoginRequest, db: Session = Depends(get_db)):
             detail="Invalid username, password, or role",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.user_id}, expires_delta=access_token_expires
-    )
-    return {
-        "user": user,
-        "access_token": access_token,
-        "token_type": "bearer"
-    }
+    return create_tokens(user)
+
+@app.post("/api/auth/refresh", response_model=schemas.LoginResponse)
+def refresh_access_token(refresh_request: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    payload = decode_token(refresh_request.refresh_token, "refresh")
+    user = crud.get_user(db, user_id=payload["sub"])
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # refresh tokens are single use
+    revocation.revoke_token(payload["jti"], payload["exp"])
+    return create_tokens(user)
+
+@app.post("/api/auth/logout")
+def logout(logout_request: schemas.LogoutRequest, current_user: TokenUser = Depends(get_current_user)):
+    revocation.revoke_token(current_user.jti, current_user.expires_at)
+    if logout_request.refresh_token:
+        try:
+            payload = jwt.decode(logout_request.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("sub") == current_user.user_id and payload.get("jti"):
+                revocation.revoke_token(payload["jti"], payload["exp"])
+        except InvalidTokenError:
+            pass
+    return {"message": "Logged out successfully"}
 
 # User endpoints
 @app.get("/api/users", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     users = crud.get_users(db, skip=skip, limit=limit)
     return users
 
 @app.post("/api/users", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_user = crud.get_user_by_username(db, username=user.username)
@@ -184,7 +316,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), current
     return crud.create_user(db=db, user=user)
 
 @app.put("/api/users/{user_id}", response_model=schemas.User)
-def update_user(user_id: str, user_update: schemas.UserUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def update_user(user_id: str, user_update: schemas.UserUpdate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_user = crud.update_user(db, user_id, user_update)
@@ -193,9 +325,11 @@ def update_user(user_id: str, user_update: schemas.UserUpdate, db: Session = Dep
     return db_user
 
 @app.delete("/api/users/{user_id}")
-def delete_user(user_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def delete_user(user_id: str, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    if crud.get_users_in_use(db, [user_id]):
+        raise HTTPException(status_code=400, detail="User created projects or assigned subsystems and cannot be deleted")
     db_user = crud.delete_user(db, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -203,27 +337,32 @@ def delete_user(user_id: str, db: Session = Depends(get_db), current_user: model
 
 # Project endpoints
 @app.get("/api/projects", response_model=List[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_projects(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    not_modified = conditional_response(request, response, "projects")
+    if not_modified:
+        return not_modified
     projects = crud.get_projects(db, skip=skip, limit=limit)
     return projects
 
 @app.post("/api/projects", response_model=schemas.Project)
-def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role not in ["PM", "DPD"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return crud.create_project(db=db, project=project, created_by=current_user.user_id)
 
 @app.put("/api/projects/{project_id}", response_model=schemas.Project)
-def update_project(project_id: str, project_update: schemas.ProjectUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def update_project(project_id: str, project_update: schemas.ProjectUpdate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role not in ["PM", "DPD"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_project = crud.update_project(db, project_id, project_update)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
+    if project_update.closed:
+        archive_worker.trigger()
     return db_project
 
 @app.delete("/api/projects/{project_id}")
-def delete_project(project_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def delete_project(project_id: str, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_project = crud.delete_project(db, project_id)
@@ -233,18 +372,21 @@ def delete_project(project_id: str, db: Session = Depends(get_db), current_user:
 
 # Subsystem endpoints
 @app.get("/api/subsystems", response_model=List[schemas.Subsystem])
-def read_subsystems(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    subsystems = crud.get_subsystems(db, skip=skip, limit=limit)
+def read_subsystems(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    not_modified = conditional_response(request, response, "subsystems")
+    if not_modified:
+        return not_modified
+    subsystems = catalog.get_catalog(db).subsystems[skip:skip + limit]
     return subsystems
 
 @app.post("/api/subsystems", response_model=schemas.Subsystem)
-def create_subsystem(subsystem: schemas.SubsystemCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def create_subsystem(subsystem: schemas.SubsystemCreate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role not in ["PM", "DPD"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return crud.create_subsystem(db=db, subsystem=subsystem)
 
 @app.put("/api/subsystems/{subsystem_id}", response_model=schemas.Subsystem)
-def update_subsystem(subsystem_id: str, subsystem_update: schemas.SubsystemUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def update_subsystem(subsystem_id: str, subsystem_update: schemas.SubsystemUpdate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role not in ["PM", "DPD"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_subsystem = crud.update_subsystem(db, subsystem_id, subsystem_update)
@@ -253,7 +395,7 @@ def update_subsystem(subsystem_id: str, subsystem_update: schemas.SubsystemUpdat
     return db_subsystem
 
 @app.delete("/api/subsystems/{subsystem_id}")
-def delete_subsystem(subsystem_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def delete_subsystem(subsystem_id: str, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_subsystem = crud.delete_subsystem(db, subsystem_id)
@@ -263,21 +405,24 @@ def delete_subsystem(subsystem_id: str, db: Session = Depends(get_db), current_u
 
 # Activity endpoints
 @app.get("/api/activities", response_model=List[schemas.Activity])
-def read_activities(activity_type: Optional[str] = None, associated_with: Optional[str] = None, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_activities(request: Request, response: Response, activity_type: Optional[str] = None, associated_with: Optional[str] = None, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    not_modified = conditional_response(request, response, "activities")
+    if not_modified:
+        return not_modified
     if activity_type and associated_with:
         activities = crud.get_activities_by_type_and_association(db, activity_type, associated_with)
     else:
-        activities = crud.get_activities(db)
+        activities = catalog.get_catalog(db).activities
     return activities
 
 @app.post("/api/activities", response_model=schemas.Activity)
-def create_activity(activity: schemas.ActivityCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def create_activity(activity: schemas.ActivityCreate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role not in ["PM", "ENGINEER"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return crud.create_activity(db=db, activity=activity)
 
 @app.put("/api/activities/{activity_id}", response_model=schemas.Activity)
-def update_activity(activity_id: str, activity_update: schemas.ActivityUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def update_activity(activity_id: str, activity_update: schemas.ActivityUpdate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role not in ["ADMIN", "PM", "ENGINEER"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_activity = crud.update_activity(db, activity_id, activity_update)
@@ -286,7 +431,7 @@ def update_activity(activity_id: str, activity_update: schemas.ActivityUpdate, d
     return db_activity
 
 @app.delete("/api/activities/{activity_id}")
-def delete_activity(activity_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def delete_activity(activity_id: str, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     db_activity = crud.delete_activity(db, activity_id)
@@ -294,21 +439,54 @@ def delete_activity(activity_id: str, db: Session = Depends(get_db), current_use
         raise HTTPException(status_code=404, detail="Activity not found")
     return {"message": "Activity deleted successfully"}
 
+# Activity Dependency endpoints
+@app.get("/api/activity-dependencies", response_model=List[schemas.ActivityDependency])
+def read_activity_dependencies(request: Request, response: Response, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    not_modified = conditional_response(request, response, "activity_dependencies")
+    if not_modified:
+        return not_modified
+    return crud.get_activity_dependencies(db)
+
+@app.post("/api/activity-dependencies", response_model=schemas.ActivityDependency)
+def create_activity_dependency(dependency: schemas.ActivityDependencyCreate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role not in ["ADMIN", "PM"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    reference = catalog.get_catalog(db)
+    if dependency.activity_id not in reference.activities_by_id or dependency.depends_on_id not in reference.activities_by_id:
+        raise HTTPException(status_code=404, detail="Activity not found")
+    if crud.get_activity_dependency_by_pair(db, dependency.activity_id, dependency.depends_on_id):
+        raise HTTPException(status_code=400, detail="Dependency already exists")
+    if crud.creates_dependency_cycle(db, dependency.activity_id, dependency.depends_on_id):
+        raise HTTPException(status_code=400, detail="Dependency would create a cycle")
+    return crud.create_activity_dependency(db=db, dependency=dependency)
+
+@app.delete("/api/activity-dependencies/{dependency_id}")
+def delete_activity_dependency(dependency_id: str, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role not in ["ADMIN", "PM"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    db_dependency = crud.delete_activity_dependency(db, dependency_id)
+    if db_dependency is None:
+        raise HTTPException(status_code=404, detail="Dependency not found")
+    return {"message": "Dependency deleted successfully"}
+
 # Project Subsystem Mapping endpoints
 @app.get("/api/project-subsystem-mappings", response_model=List[schemas.ProjectSubsystemMapping])
-def read_project_subsystem_mappings(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_project_subsystem_mappings(request: Request, response: Response, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    not_modified = conditional_response(request, response, "project_subsystem_mappings")
+    if not_modified:
+        return not_modified
     mappings = crud.get_project_subsystem_mappings(db)
     return mappings
 
 @app.post("/api/project-subsystem-mappings", response_model=schemas.ProjectSubsystemMapping)
-def create_project_subsystem_mapping(mapping: schemas.ProjectSubsystemMappingCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def create_project_subsystem_mapping(mapping: schemas.ProjectSubsystemMappingCreate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role not in ["PM", "DPD"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return crud.create_project_subsystem_mapping(db=db, mapping=mapping, assigned_by=current_user.user_id)
 
 # Project Progress endpoints
 @app.get("/api/project-progress", response_model=List[schemas.ProjectProgress])
-def read_project_progress(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_project_progress(db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
     if current_user.role == "ENGINEER":
         progress = crud.get_project_progress_by_user(db, current_user.user_id)
     else:
@@ -316,16 +494,139 @@ def read_project_progress(db: Session = Depends(get_db), current_user: models.Us
     return progress
 
 @app.post("/api/project-progress", response_model=schemas.ProjectProgress)
-def create_or_update_project_progress(progress: schemas.ProjectProgressCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def create_or_update_project_progress(progress: schemas.ProjectProgressCreate, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    db_project = crud.get_project(db, progress.project_id)
+    if db_project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    # progress of closed projects is archived; reopen the project first
+    if db_project.closed_at:
+        raise HTTPException(status_code=400, detail="Project is closed")
     return crud.create_or_update_project_progress(db=db, progress=progress, user_id=current_user.user_id)
 
-# Report endpoints
-@app.post("/api/reports/project-activity", response_model=schemas.ChartData)
-def get_project_activity_report(filters: schemas.ReportFilter, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+# Bootstrap endpoint: everything the client loads after login in one response
+BOOTSTRAP_COLLECTIONS = {
+    # name: (version table, roles allowed, loader)
+    "users": ("users", ["ADMIN"], lambda db, user: crud.get_users(db)),
+    "projects": ("projects", None, lambda db, user: crud.get_projects(db)),
+    "subsystems": ("subsystems", None, lambda db, user: catalog.get_catalog(db).subsystems),
+    "activities": ("activities", None, lambda db, user: catalog.get_catalog(db).activities),
+    "activity_dependencies": ("activity_dependencies", None, lambda db, user: crud.get_activity_dependencies(db)),
+    "project_subsystem_mappings": ("project_subsystem_mappings", None, lambda db, user: crud.get_project_subsystem_mappings(db)),
+    "project_progress": ("project_progress", None, lambda db, user: (
+        crud.get_project_progress_by_user(db, user.user_id) if user.role == "ENGINEER" else crud.get_all_project_progress(db)
+    )),
+}
+
+def bootstrap_token(table: str, current_user: TokenUser) -> str:
+    # engineers only see their own progress, so their token is per user
+    variant = current_user.user_id if table == "project_progress" and current_user.role == "ENGINEER" else ""
+    return versions.etag([table], variant).strip('"')
+
+@app.get("/api/bootstrap", response_model=schemas.Bootstrap)
+def bootstrap(known: Optional[str] = Query(None, description="comma-separated collection:token pairs the client already holds"), db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    client_tokens = dict(item.split(":", 1) for item in known.split(",") if ":" in item) if known else {}
+    # tokens are taken before reading, so a concurrent write makes them stale
+    # rather than letting the client skip data it has not seen
+    tokens = {
+        name: bootstrap_token(table, current_user)
+        for name, (table, roles, _) in BOOTSTRAP_COLLECTIONS.items()
+        if roles is None or current_user.role in roles
+    }
+    # one read transaction, so all collections come from the same snapshot
+    db.connection().exec_driver_sql("BEGIN")
+    result = {"versions": tokens}
+    for name, token in tokens.items():
+        if client_tokens.get(name) != token:
+            result[name] = BOOTSTRAP_COLLECTIONS[name][2](db, current_user)
+    return result
+
+# Bulk import endpoints
+# Imports, like the reports, run on the reports thread pool
+def run_import(entity: str, file: UploadFile, db: Session, current_user: TokenUser):
+    try:
+        return bulk_import.import_csv(db, entity, file.file, current_user)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV file: {e}")
+
+@app.post("/api/import/{entity}", response_model=schemas.ImportResult)
+async def import_entities(entity: str, file: UploadFile = File(...), db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    if entity not in bulk_import.ENTITIES:
+        raise HTTPException(status_code=404, detail="Unknown import entity")
+    if entity != "project-progress" and current_user.role not in ["PM", "DPD"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return await admission.run_in_pool("reports", run_import, entity, file, db, current_user)
+
+# Search endpoint
+@app.get("/api/search", response_model=schemas.SearchResponse)
+def search_entities(q: str = Query(..., min_length=1, max_length=200), types: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    entity_types = [t.strip() for t in types.split(",")] if types else None
+    return search.search(db, q, current_user, entity_types=entity_types, skip=skip, limit=limit)
+
+# Bulk delete endpoints
+BULK_DELETES = {
+    "users": crud.delete_users,
+    "projects": crud.delete_projects,
+    "subsystems": crud.delete_subsystems,
+    "activities": crud.delete_activities,
+}
+
+@app.post("/api/{entity}/bulk-delete", response_model=schemas.BulkDeleteResult)
+def bulk_delete(entity: str, request: schemas.BulkDeleteRequest, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    if entity not in BULK_DELETES:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if entity == "users":
+        in_use = crud.get_users_in_use(db, request.ids)
+        if in_use:
+            raise HTTPException(status_code=400, detail=f"Users created projects or assigned subsystems and cannot be deleted: {', '.join(in_use)}")
+    deleted = BULK_DELETES[entity](db, request.ids)
+    found = set(deleted)
+    return {"deleted": len(deleted), "not_found": [i for i in dict.fromkeys(request.ids) if i not in found]}
+
+# Audit log endpoint; entries reach the table within AUDIT_FLUSH_INTERVAL_SECONDS
+@app.get("/api/audit", response_model=List[schemas.AuditEntry])
+def read_audit_log(entity: Optional[str] = None, entity_id: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return crud.get_audit_log(db, entity=entity, entity_id=entity_id, since=since, until=until, skip=skip, limit=limit)
+
+# Archive endpoints; both move whole projects of rows, so they run on the
+# reports thread pool
+def run_archive_batches(db: Session):
+    archived = archive.archive_closed_projects(db)
+    return {"message": f"Archived {archived} progress entries", "archived": archived}
+
+def restore_project_progress(project_id: str, db: Session):
+    if crud.get_project(db, project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    restored = archive.restore_project(db, project_id)
+    return {"message": f"Restored {restored} progress entries", "restored": restored}
+
+@app.post("/api/archive/run")
+async def run_archive(db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return await admission.run_in_pool("reports", run_archive_batches, db)
+
+@app.post("/api/archive/projects/{project_id}/restore")
+async def restore_archived_project(project_id: str, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role not in ["ADMIN", "PM", "DPD"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return await admission.run_in_pool("reports", restore_project_progress, project_id, db)
+
+# Report builders, run on the reports thread pool by the endpoints below
+def build_project_activity_report(filters: schemas.ReportFilter, db: Session):
     # Implementation for project vs activity report
     projects = crud.get_projects(db)
-    activities = crud.get_activities(db)
+    activities = catalog.get_catalog(db).activities
     progress = crud.get_all_project_progress(db)
+    if filters.include_archived:
+        progress += crud.get_archived_project_progress(db, filters.project_ids)
+    else:
+        # the progress of closed projects is archived; they are left out
+        # rather than shown at 0%
+        projects = [p for p in projects if p.closed_at is None]
     
     # Filter data based on filters
     if filters.project_ids:
@@ -336,6 +637,9 @@ def get_project_activity_report(filters: schemas.ReportFilter, db: Session = Dep
     # Generate chart data
     if len(filters.project_ids or []) == 1 and len(filters.activity_ids or []) > 1:
         # Pie chart: One project, multiple activities
+        project = crud.get_project(db, filters.project_ids[0])
+        if not filters.include_archived and project is not None and project.closed_at is not None:
+            return schemas.ChartData(labels=[], data=[], chart_type="pie", title="Activity Progress for Selected Project")
         labels = [a.activity_name for a in activities if a.activity_id in (filters.activity_ids or [])]
         data = []
         for activity_id in (filters.activity_ids or []):
@@ -365,12 +669,14 @@ def get_project_activity_report(filters: schemas.ReportFilter, db: Session = Dep
             title="Project Progress Overview"
         )
 
-@app.post("/api/reports/subsystem-activity", response_model=schemas.ChartData)
-def get_subsystem_activity_report(filters: schemas.ReportFilter, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def build_subsystem_activity_report(filters: schemas.ReportFilter, db: Session):
     # Similar implementation for subsystem vs activity report
-    subsystems = crud.get_subsystems(db)
-    activities = crud.get_activities(db)
+    reference = catalog.get_catalog(db)
+    subsystems = reference.subsystems
+    activities = reference.activities
     progress = crud.get_all_project_progress(db)
+    if filters.include_archived:
+        progress += crud.get_archived_project_progress(db)
     
     # Filter data
     if filters.subsystem_ids:
@@ -393,24 +699,15 @@ def get_subsystem_activity_report(filters: schemas.ReportFilter, db: Session = D
         title="Subsystem Progress Overview"
     )
 
-@app.post("/api/reports/gantt", response_model=List[schemas.GanttData])
-def get_gantt_report(filters: schemas.ReportFilter, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    progress = crud.get_all_project_progress(db)
-    projects = crud.get_projects(db)
-    subsystems = crud.get_subsystems(db)
-    activities = crud.get_activities(db)
-    
-    # Filter completed activities with dates
-    completed_progress = [p for p in progress if p.status == "COMPLETED" and p.completion_date and p.start_date]
-    
-    if filters.project_ids:
-        completed_progress = [p for p in completed_progress if p.project_id in filters.project_ids]
+def build_gantt_report(filters: schemas.ReportFilter, db: Session):
+    completed_progress = crud.get_completed_project_progress(db, filters.project_ids, filters.include_archived)
+    reference = catalog.get_catalog(db)
     
     gantt_data = []
     for p in completed_progress:
-        project = next((proj for proj in projects if proj.project_id == p.project_id), None)
-        subsystem = next((sub for sub in subsystems if sub.subsystem_id == p.subsystem_id), None)
-        activity = next((act for act in activities if act.activity_id == p.activity_id), None)
+        project = p.project
+        subsystem = reference.subsystems_by_id.get(p.subsystem_id)
+        activity = reference.activities_by_id.get(p.activity_id)
         
         if project and subsystem and activity:
             duration = (p.completion_date - p.start_date).days + 1
@@ -428,6 +725,39 @@ def get_gantt_report(filters: schemas.ReportFilter, db: Session = Depends(get_db
     gantt_data.sort(key=lambda x: x.completion_date)
     return gantt_data
 
+def build_schedule_report(filters: schemas.ReportFilter, db: Session):
+    return schedule.build_schedule(db, filters)
+
+# Report endpoints
+@app.post("/api/reports/project-activity", response_model=schemas.ChartData)
+async def get_project_activity_report(filters: schemas.ReportFilter, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    return await admission.run_in_pool("reports", build_project_activity_report, filters, db)
+
+@app.post("/api/reports/subsystem-activity", response_model=schemas.ChartData)
+async def get_subsystem_activity_report(filters: schemas.ReportFilter, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    return await admission.run_in_pool("reports", build_subsystem_activity_report, filters, db)
+
+@app.post("/api/reports/gantt", response_model=List[schemas.GanttData])
+async def get_gantt_report(filters: schemas.ReportFilter, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    return await admission.run_in_pool("reports", build_gantt_report, filters, db)
+
+@app.post("/api/reports/schedule", response_model=List[schemas.ScheduleBar])
+async def get_schedule_report(filters: schemas.ReportFilter, db: Session = Depends(get_db), current_user: TokenUser = Depends(get_current_user)):
+    return await admission.run_in_pool("reports", build_schedule_report, filters, db)
+
+# Monitoring
+@app.get("/api/admin/admission")
+def read_admission_stats(current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return admission.stats()
+
+@app.get("/api/admin/audit")
+def read_audit_stats(current_user: TokenUser = Depends(get_current_user)):
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return audit.buffer.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
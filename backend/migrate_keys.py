@@ -0,0 +1,103 @@
+import argparse
+import os
+import sqlite3
+import sys
+import uuid
+
+import models, search
+
+# Converts the uuid4 key columns of an existing SQLite database between the
+# 36-character text form and the 16-byte blob form (see models.KEY_STORAGE),
+# and drops the redundant ix_<table>_<pk> indexes that older versions of the
+# models created on top of the primary key.
+#
+#   python migrate_keys.py --to blob [--db project_management.db]
+#
+# Order for an existing database: stop the API, upgrade the schema (start the
+# current version once with the old KEY_STORAGE, which runs
+# database.ensure_schema), stop it again, migrate, then start the API with
+# KEY_STORAGE set to the new mode. Tables and columns the database does not
+# have yet are skipped; ensure_schema creates them empty later.
+
+
+def key_columns():
+    for table in models.Base.metadata.sorted_tables:
+        columns = [column.name for column in table.columns if isinstance(column.type, models.UUIDKey)]
+        if columns:
+            yield table.name, columns, [column.name for column in table.primary_key.columns]
+
+
+def to_blob(value):
+    if isinstance(value, str):
+        try:
+            return uuid.UUID(value).bytes
+        except ValueError:
+            return value
+    return value
+
+
+def to_text(value):
+    if isinstance(value, bytes) and len(value) == 16:
+        return str(uuid.UUID(bytes=value))
+    return value
+
+
+def database_size(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    return page_size * page_count
+
+
+def migrate(path: str, target: str):
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.create_function("convert_key", 1, to_blob if target == "blob" else to_text, deterministic=True)
+        source_type = "text" if target == "blob" else "blob"
+        before = database_size(conn)
+
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("BEGIN")
+        try:
+            for table, columns, primary_key in key_columns():
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if not existing:
+                    print(f"{table}: not in the database, skipped")
+                    continue
+                for column in columns:
+                    if column not in existing:
+                        print(f"{table}.{column}: not in the database, skipped")
+                        continue
+                    cursor = conn.execute(
+                        f"UPDATE {table} SET {column} = convert_key({column}) WHERE typeof({column}) = ?",
+                        (source_type,),
+                    )
+                    print(f"{table}.{column}: {cursor.rowcount} values converted")
+                for column in primary_key:
+                    conn.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        conn.execute("VACUUM")
+        # VACUUM may renumber rowids, which the full-text indexes are keyed on
+        search.rebuild_search_indexes(conn)
+        after = database_size(conn)
+        print(f"database size: {before:,} -> {after:,} bytes")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert key storage of an existing database")
+    parser.add_argument("--db", default="project_management.db")
+    parser.add_argument("--to", choices=["blob", "text"], required=True)
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+    migrate(args.db, args.to)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
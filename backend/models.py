@@ -1,11 +1,47 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Date
+from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Date, LargeBinary, Integer, Float, UniqueConstraint, Index, JSON
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
+import os
+import uuid
 
 Base = declarative_base()
 
+# With STRICT_LOADING=1 (tests / local profiling) any relationship access that
+# was not eager-loaded by the query raises instead of issuing a lazy SELECT
+RELATIONSHIP_LOADING = "raise" if os.getenv("STRICT_LOADING") == "1" else "select"
+
+# Storage format of the uuid4 keys: "text" keeps the 36-character strings,
+# "blob" stores them as 16 raw bytes. The API always sees the string form.
+# An existing database must be converted with migrate_keys.py before
+# switching modes.
+KEY_STORAGE = os.getenv("KEY_STORAGE", "text")
+
+class UUIDKey(TypeDecorator):
+    impl = String
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if KEY_STORAGE == "blob":
+            return dialect.type_descriptor(LargeBinary(16))
+        return dialect.type_descriptor(String())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or KEY_STORAGE != "blob":
+            return value
+        try:
+            return uuid.UUID(value).bytes
+        except (ValueError, AttributeError, TypeError):
+            # Not a uuid, so it cannot match any stored key
+            return value
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, bytes):
+            return str(uuid.UUID(bytes=value))
+        return value
+
 # Enums
 class UserRole(str, enum.Enum):
     ADMIN = "ADMIN"
@@ -30,7 +66,7 @@ class ProgressStatus(str, enum.Enum):
 class User(Base):
     __tablename__ = "users"
     
-    user_id = Column(String, primary_key=True, index=True)
+    user_id = Column(UUIDKey, primary_key=True)
     username = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
     role = Column(Enum(UserRole), nullable=False)
@@ -40,20 +76,21 @@ class User(Base):
 class Project(Base):
     __tablename__ = "projects"
     
-    project_id = Column(String, primary_key=True, index=True)
+    project_id = Column(UUIDKey, primary_key=True)
     project_name = Column(String, nullable=False)
     program_type = Column(String, nullable=False)
     description = Column(String)
-    created_by = Column(String, ForeignKey("users.user_id"), nullable=False)
+    created_by = Column(UUIDKey, ForeignKey("users.user_id"), nullable=False, index=True)
+    closed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    creator = relationship("User", back_populates="created_projects")
+    creator = relationship("User", back_populates="created_projects", lazy=RELATIONSHIP_LOADING)
 
 class Subsystem(Base):
     __tablename__ = "subsystems"
     
-    subsystem_id = Column(String, primary_key=True, index=True)
+    subsystem_id = Column(UUIDKey, primary_key=True)
     subsystem_name = Column(String, unique=True, nullable=False)
     description = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -62,37 +99,43 @@ class Subsystem(Base):
 class Activity(Base):
     __tablename__ = "activities"
     
-    activity_id = Column(String, primary_key=True, index=True)
+    activity_id = Column(UUIDKey, primary_key=True)
     activity_name = Column(String, nullable=False)
     activity_type = Column(Enum(ActivityType), nullable=False)
     associated_with = Column(Enum(AssociatedWith), nullable=False)
     description = Column(String)
+    estimated_duration_days = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class ProjectSubsystemMapping(Base):
     __tablename__ = "project_subsystem_mappings"
     
-    mapping_id = Column(String, primary_key=True, index=True)
-    project_id = Column(String, ForeignKey("projects.project_id"), nullable=False, unique=True)
-    subsystem_id = Column(String, ForeignKey("subsystems.subsystem_id"), nullable=False)
-    assigned_by = Column(String, ForeignKey("users.user_id"), nullable=False)
+    mapping_id = Column(UUIDKey, primary_key=True)
+    project_id = Column(UUIDKey, ForeignKey("projects.project_id"), nullable=False, unique=True)
+    subsystem_id = Column(UUIDKey, ForeignKey("subsystems.subsystem_id"), nullable=False, index=True)
+    assigned_by = Column(UUIDKey, ForeignKey("users.user_id"), nullable=False, index=True)
     assigned_at = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    project = relationship("Project")
-    subsystem = relationship("Subsystem")
-    assigner = relationship("User")
+    project = relationship("Project", lazy=RELATIONSHIP_LOADING)
+    subsystem = relationship("Subsystem", lazy=RELATIONSHIP_LOADING)
+    assigner = relationship("User", lazy=RELATIONSHIP_LOADING)
 
 class ProjectProgress(Base):
     __tablename__ = "project_progress"
+    # one row per (project, subsystem, activity, user); the upserts look rows
+    # up by this key, and its project_id prefix serves the per-project reads
+    __table_args__ = (
+        Index("ix_project_progress_key", "project_id", "subsystem_id", "activity_id", "user_id"),
+    )
     
-    progress_id = Column(String, primary_key=True, index=True)
-    project_id = Column(String, ForeignKey("projects.project_id"), nullable=False)
-    subsystem_id = Column(String, ForeignKey("subsystems.subsystem_id"), nullable=False)
-    activity_id = Column(String, ForeignKey("activities.activity_id"), nullable=False)
-    user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
+    progress_id = Column(UUIDKey, primary_key=True)
+    project_id = Column(UUIDKey, ForeignKey("projects.project_id"), nullable=False)
+    subsystem_id = Column(UUIDKey, ForeignKey("subsystems.subsystem_id"), nullable=False, index=True)
+    activity_id = Column(UUIDKey, ForeignKey("activities.activity_id"), nullable=False, index=True)
+    user_id = Column(UUIDKey, ForeignKey("users.user_id"), nullable=False, index=True)
     status = Column(Enum(ProgressStatus), default=ProgressStatus.NOT_STARTED)
     start_date = Column(Date)
     completion_date = Column(Date)
@@ -100,10 +143,72 @@ class ProjectProgress(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    project = relationship("Project")
-    subsystem = relationship("Subsystem")
-    activity = relationship("Activity")
-    user = relationship("User")
+    project = relationship("Project", lazy=RELATIONSHIP_LOADING)
+    subsystem = relationship("Subsystem", lazy=RELATIONSHIP_LOADING)
+    activity = relationship("Activity", lazy=RELATIONSHIP_LOADING)
+    user = relationship("User", lazy=RELATIONSHIP_LOADING)
+
+# activity_id cannot start before depends_on_id is completed
+class ActivityDependency(Base):
+    __tablename__ = "activity_dependencies"
+    __table_args__ = (UniqueConstraint("activity_id", "depends_on_id"),)
+    
+    dependency_id = Column(UUIDKey, primary_key=True)
+    activity_id = Column(UUIDKey, ForeignKey("activities.activity_id"), nullable=False)
+    depends_on_id = Column(UUIDKey, ForeignKey("activities.activity_id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Progress rows of closed projects, moved out of project_progress by archive.py
+class ProjectProgressArchive(Base):
+    __tablename__ = "project_progress_archive"
+    
+    progress_id = Column(UUIDKey, primary_key=True)
+    project_id = Column(UUIDKey, ForeignKey("projects.project_id"), nullable=False, index=True)
+    subsystem_id = Column(UUIDKey, ForeignKey("subsystems.subsystem_id"), nullable=False, index=True)
+    activity_id = Column(UUIDKey, ForeignKey("activities.activity_id"), nullable=False, index=True)
+    user_id = Column(UUIDKey, ForeignKey("users.user_id"), nullable=False, index=True)
+    status = Column(Enum(ProgressStatus), default=ProgressStatus.NOT_STARTED)
+    start_date = Column(Date)
+    completion_date = Column(Date)
+    notes = Column(String)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False)
+    
+    project = relationship("Project", lazy=RELATIONSHIP_LOADING)
+
+# Change counter per table, shared by all worker processes (see versions.py)
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+    
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+
+# Revoked token ids ("jti:<jti>") and users whose older tokens are void
+# ("user:<user_id>"), kept until the affected tokens would have expired anyway
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    key = Column(String, primary_key=True)
+    revoked_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+# Written in batches by audit.py; entity is the table name of the changed row
+class AuditLog(Base):
+    __tablename__ = "audit_log"
+    __table_args__ = (
+        Index("ix_audit_log_entity_created_at", "entity", "created_at"),
+        Index("ix_audit_log_entity_entity_id", "entity", "entity_id"),
+    )
+    
+    audit_id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    user_id = Column(UUIDKey)
+    changes = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 # Add relationships
-User.created_projects = relationship("Project", back_populates="creator")
+User.created_projects = relationship("Project", back_populates="creator", lazy=RELATIONSHIP_LOADING)
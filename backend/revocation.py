@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from typing import List
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+
+import models, versions
+from database import SessionLocal, engine
+
+# Revocation set for the stateless JWTs. Tokens are verified from their claims
+# alone, so anything that must invalidate them early (logout, refresh token
+# rotation, a user being updated or deleted) is recorded here. Entries expire
+# together with the longest-lived token they can affect, which keeps the set
+# small. It is persisted in revoked_tokens and reloaded in every worker
+# process through the versions change channel.
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+
+_lock = threading.Lock()
+_revoked_jtis = {}
+_revoked_users = {}
+
+table = models.RevokedToken.__table__
+
+
+def _store(keys: List[str], revoked_at: float, expires_at: float):
+    with SessionLocal.begin() as db:
+        db.execute(delete(table).where(table.c.expires_at < revoked_at))
+        statement = insert(table)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"revoked_at": statement.excluded.revoked_at, "expires_at": statement.excluded.expires_at},
+        ), [{"key": key, "revoked_at": revoked_at, "expires_at": expires_at} for key in keys])
+        versions.bump(db, "revoked_tokens")
+
+
+def _prune(now: float):
+    # Same expiry as the delete in _store, for the in-memory copy; it is only
+    # rebuilt when another process writes. Called with _lock held
+    global _revoked_jtis, _revoked_users
+    user_cutoff = now - REFRESH_TOKEN_EXPIRE_DAYS * 86400
+    _revoked_jtis = {jti: expires_at for jti, expires_at in _revoked_jtis.items() if expires_at >= now}
+    _revoked_users = {user_id: revoked_at for user_id, revoked_at in _revoked_users.items() if revoked_at >= user_cutoff}
+
+
+def revoke_token(jti: str, expires_at: float):
+    now = time.time()
+    with _lock:
+        _prune(now)
+        _revoked_jtis[jti] = expires_at
+    _store([f"jti:{jti}"], now, expires_at)
+
+
+def revoke_user(user_id: str):
+    revoke_users([user_id])
+
+
+def revoke_users(user_ids: List[str]):
+    # every token of the users issued up to now becomes invalid
+    if not user_ids:
+        return
+    now = time.time()
+    expires_at = now + REFRESH_TOKEN_EXPIRE_DAYS * 86400
+    with _lock:
+        _prune(now)
+        for user_id in user_ids:
+            _revoked_users[user_id] = now
+    _store([f"user:{user_id}" for user_id in user_ids], now, expires_at)
+
+
+def is_revoked(payload: dict) -> bool:
+    if payload.get("jti") in _revoked_jtis:
+        return True
+    revoked_at = _revoked_users.get(payload.get("sub"))
+    return revoked_at is not None and payload.get("iat", 0) <= revoked_at
+
+
+def reload():
+    now = time.time()
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(table.c.key, table.c.revoked_at, table.c.expires_at).where(table.c.expires_at >= now)
+        ).all()
+    jtis, users = {}, {}
+    for key, revoked_at, expires_at in rows:
+        kind, _, value = key.partition(":")
+        if kind == "jti":
+            jtis[value] = expires_at
+        elif kind == "user":
+            users[value] = revoked_at
+    global _revoked_jtis, _revoked_users
+    with _lock:
+        _revoked_jtis, _revoked_users = jtis, users
+
+
+versions.on_change(["revoked_tokens"], reload)
@@ -0,0 +1,414 @@
+import os
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+import models, schemas, catalog, versions
+
+# Critical-path scheduling per project. The network of a project is every
+# activity of its program type plus any activity it has progress on, ordered
+# by the activity_dependencies edges. A forward pass from the aggregated
+# progress state gives earliest start/finish (completed work is fixed at its
+# actual dates, open work is forecast from today), a backward pass from the
+# project finish gives latest start/finish and slack.
+#
+# Schedules are cached per project. A progress write recomputes only the
+# changed activity and its successors (forward) and their predecessors
+# (backward); graph or duration changes drop the whole cache. Dates are
+# day ordinals, finishes are exclusive.
+
+DEFAULT_ACTIVITY_DURATION_DAYS = int(os.getenv("DEFAULT_ACTIVITY_DURATION_DAYS", "14"))
+
+# project ids per IN (...) list when aggregating progress
+PROJECT_CHUNK_SIZE = 500
+
+COMPLETED = models.ProgressStatus.COMPLETED.value
+IN_PROGRESS = models.ProgressStatus.IN_PROGRESS.value
+NOT_STARTED = models.ProgressStatus.NOT_STARTED.value
+
+
+class ScheduleNode:
+    __slots__ = ("activity_id", "status", "actual_start", "actual_finish", "duration",
+                 "earliest_start", "earliest_finish", "latest_start", "latest_finish")
+
+    def __init__(self, activity_id: str, duration: int):
+        self.activity_id = activity_id
+        self.duration = duration
+        self.status = NOT_STARTED
+        self.actual_start = None
+        self.actual_finish = None
+
+    def set_progress(self, completed: int, in_progress: int, total: int, start: Optional[date], finish: Optional[date]):
+        # several subsystems/engineers report on the same activity: it is done
+        # when all of them are, started when any of them is
+        if total and completed == total:
+            self.status = COMPLETED
+        elif in_progress or completed:
+            self.status = IN_PROGRESS
+        else:
+            self.status = NOT_STARTED
+        self.actual_start = start.toordinal() if start else None
+        self.actual_finish = finish.toordinal() if finish and self.status == COMPLETED else None
+
+    @property
+    def slack(self) -> int:
+        return self.latest_finish - self.earliest_finish
+
+
+class ProjectSchedule:
+    __slots__ = ("project_id", "project_name", "program_type", "computed_on", "fingerprint",
+                 "nodes", "order", "finish", "_bars")
+
+    def __init__(self, project, computed_on: int, fingerprint):
+        self.project_id = project.project_id
+        self.project_name = project.project_name
+        self.program_type = project.program_type
+        self.computed_on = computed_on
+        self.fingerprint = fingerprint
+        self.nodes: Dict[str, ScheduleNode] = {}
+        self.order: List[str] = []
+        self.finish = computed_on
+        self._bars = None
+
+    def forward(self, activity_ids: Iterable[str], reference: catalog.ReferenceCatalog):
+        today = self.computed_on
+        for activity_id in activity_ids:
+            node = self.nodes[activity_id]
+            ready = max(
+                (self.nodes[p].earliest_finish for p in reference.predecessors.get(activity_id, ()) if p in self.nodes),
+                default=today,
+            )
+            if node.status == COMPLETED:
+                if node.actual_finish is not None:
+                    node.earliest_finish = node.actual_finish + 1
+                else:
+                    node.earliest_finish = node.actual_start + node.duration if node.actual_start is not None else today
+                node.earliest_start = node.actual_start if node.actual_start is not None else node.earliest_finish - node.duration
+            elif node.status == IN_PROGRESS:
+                node.earliest_start = node.actual_start if node.actual_start is not None else today
+                node.earliest_finish = max(node.earliest_start + node.duration, today + 1)
+            else:
+                node.earliest_start = max(ready, today)
+                node.earliest_finish = node.earliest_start + node.duration
+
+    def backward(self, activity_ids: Iterable[str], reference: catalog.ReferenceCatalog):
+        for activity_id in activity_ids:
+            node = self.nodes[activity_id]
+            if node.status == COMPLETED:
+                node.latest_start, node.latest_finish = node.earliest_start, node.earliest_finish
+                continue
+            node.latest_finish = min(
+                (self.nodes[s].latest_start for s in reference.successors.get(activity_id, ())
+                 if s in self.nodes and self.nodes[s].status != COMPLETED),
+                default=self.finish,
+            )
+            node.latest_start = node.latest_finish - (node.earliest_finish - node.earliest_start)
+
+    def compute(self, reference: catalog.ReferenceCatalog):
+        self._bars = None
+        self.forward(self.order, reference)
+        self.finish = max((node.earliest_finish for node in self.nodes.values()), default=self.computed_on)
+        self.backward(reversed(self.order), reference)
+
+    def update(self, activity_id: str, reference: catalog.ReferenceCatalog):
+        # forward pass over the activity and everything downstream of it; the
+        # backward pass only needs to revisit those and their predecessors,
+        # unless the project finish moved
+        self._bars = None
+        position = {a: i for i, a in enumerate(self.order)}
+        downstream = _reachable([activity_id], reference.successors, self.nodes)
+        self.forward(sorted(downstream, key=position.get), reference)
+        finish = max((node.earliest_finish for node in self.nodes.values()), default=self.computed_on)
+        if finish != self.finish:
+            self.finish = finish
+            self.backward(reversed(self.order), reference)
+        else:
+            upstream = _reachable(downstream, reference.predecessors, self.nodes)
+            self.backward(sorted(upstream, key=position.get, reverse=True), reference)
+
+    def bars(self, reference: catalog.ReferenceCatalog, activity_ids=None) -> List[schemas.ScheduleBar]:
+        if self._bars is None:
+            self._bars = self._build_bars(reference)
+        if activity_ids:
+            return [bar for bar in self._bars if bar.activity_id in activity_ids]
+        return self._bars
+
+    def _build_bars(self, reference: catalog.ReferenceCatalog) -> List[schemas.ScheduleBar]:
+        bars = []
+        for activity_id in self.order:
+            node = self.nodes[activity_id]
+            if node.status == COMPLETED:
+                continue
+            bars.append(schemas.ScheduleBar(
+                project_id=self.project_id,
+                project_name=self.project_name,
+                activity_id=activity_id,
+                activity_name=reference.activity_name(activity_id) or "",
+                status=node.status,
+                start_date=date.fromordinal(node.earliest_start),
+                finish_date=date.fromordinal(node.earliest_finish - 1),
+                duration_days=node.earliest_finish - node.earliest_start,
+                latest_start=date.fromordinal(node.latest_start),
+                slack_days=node.slack,
+                is_critical=node.slack <= 0,
+                forecast=node.status == NOT_STARTED or node.earliest_start + node.duration < node.earliest_finish,
+            ))
+        return bars
+
+
+def _reachable(start: Iterable[str], edges: Dict[str, List[str]], nodes) -> set:
+    seen = set()
+    stack = [a for a in start if a in nodes]
+    while stack:
+        activity_id = stack.pop()
+        if activity_id in seen:
+            continue
+        seen.add(activity_id)
+        stack.extend(a for a in edges.get(activity_id, ()) if a in nodes and a not in seen)
+    return seen
+
+
+def topological_order(reference: catalog.ReferenceCatalog) -> Dict[str, int]:
+    # position of every activity in one global order of the dependency graph
+    remaining = {a.activity_id: 0 for a in reference.activities}
+    for dependency in reference.dependencies:
+        if dependency.activity_id in remaining and dependency.depends_on_id in remaining:
+            remaining[dependency.activity_id] += 1
+    ready = [a for a, count in remaining.items() if count == 0]
+    order = []
+    while ready:
+        activity_id = ready.pop()
+        order.append(activity_id)
+        for successor in reference.successors.get(activity_id, ()):
+            if successor in remaining:
+                remaining[successor] -= 1
+                if remaining[successor] == 0:
+                    ready.append(successor)
+    # crud rejects cycles, but never lose activities if one slipped in
+    placed = set(order)
+    order.extend(a for a in remaining if a not in placed)
+    return {activity_id: i for i, activity_id in enumerate(order)}
+
+
+_lock = threading.RLock()
+_schedules: Dict[str, ProjectSchedule] = {}
+_generation = 0
+_stale = False
+_graph = None
+_durations = None
+
+
+def invalidate(project_ids: Iterable[str]):
+    global _generation
+    with _lock:
+        _generation += 1
+        for project_id in project_ids:
+            _schedules.pop(project_id, None)
+
+
+def invalidate_all():
+    # historical durations stay: they are fixed for the day (_get_durations)
+    global _generation, _graph
+    with _lock:
+        _generation += 1
+        _schedules.clear()
+        _graph = None
+
+
+def mark_stale():
+    # another worker wrote progress: fingerprints are checked on next use
+    global _stale
+    with _lock:
+        _stale = True
+
+
+versions.on_change(["activities", "activity_dependencies"], invalidate_all)
+versions.on_change(["project_progress"], mark_stale)
+
+
+def _graph_order(reference: catalog.ReferenceCatalog) -> Dict[str, int]:
+    global _graph
+    graph = _graph
+    if graph is None or graph[0] is not reference:
+        graph = _graph = (reference, topological_order(reference))
+    return graph[1]
+
+
+def historical_durations(db: Session) -> Dict[str, int]:
+    # mean actual duration per activity over all completed work, archive included
+    totals = {}
+    for table in (models.ProjectProgress, models.ProjectProgressArchive):
+        days = func.julianday(table.completion_date) - func.julianday(table.start_date) + 1
+        rows = db.query(table.activity_id, func.sum(days), func.count()).filter(
+            table.status == models.ProgressStatus.COMPLETED,
+            table.start_date.isnot(None),
+            table.completion_date.isnot(None),
+        ).group_by(table.activity_id)
+        for activity_id, total, count in rows:
+            previous = totals.get(activity_id, (0, 0))
+            totals[activity_id] = (previous[0] + total, previous[1] + count)
+    return {a: max(1, round(total / count)) for a, (total, count) in totals.items()}
+
+
+def _duration(activity: catalog.ActivityRecord, durations: Dict[str, int]) -> int:
+    if activity.estimated_duration_days:
+        return activity.estimated_duration_days
+    return durations.get(activity.activity_id, DEFAULT_ACTIVITY_DURATION_DAYS)
+
+
+def _get_durations(db: Session) -> Dict[str, int]:
+    # Loaded once per day; every cached schedule was built with the same
+    # durations, so incremental updates and rebuilds agree
+    global _durations, _generation
+    durations = _durations
+    if durations is None or durations[0] != date.today():
+        durations = (date.today(), historical_durations(db))
+        with _lock:
+            _durations = durations
+            _generation += 1
+            _schedules.clear()
+    return durations[1]
+
+
+def _progress_query(db: Session):
+    progress = models.ProjectProgress
+    return db.query(
+        progress.project_id,
+        progress.activity_id,
+        func.sum(case((progress.status == models.ProgressStatus.COMPLETED, 1), else_=0)),
+        func.sum(case((progress.status == models.ProgressStatus.IN_PROGRESS, 1), else_=0)),
+        func.count(),
+        func.min(progress.start_date),
+        func.max(progress.completion_date),
+    )
+
+
+def _fingerprints(db: Session, project_ids: List[str]) -> Dict[str, tuple]:
+    progress = models.ProjectProgress
+    fingerprints = {}
+    for start in range(0, len(project_ids), PROJECT_CHUNK_SIZE):
+        chunk = project_ids[start:start + PROJECT_CHUNK_SIZE]
+        for project_id, count, updated_at in db.query(
+            progress.project_id, func.count(), func.max(progress.updated_at)
+        ).filter(progress.project_id.in_(chunk)).group_by(progress.project_id):
+            fingerprints[project_id] = (count, updated_at)
+    return fingerprints
+
+
+def _build(project, rows, fingerprint, reference, order, durations, today: int) -> ProjectSchedule:
+    schedule = ProjectSchedule(project, today, fingerprint)
+    scope = {a.activity_id for a in reference.activities if a.activity_type == project.program_type}
+    scope.update(row[1] for row in rows)
+    for activity_id in scope:
+        activity = reference.activities_by_id.get(activity_id)
+        if activity is not None:
+            schedule.nodes[activity_id] = ScheduleNode(activity_id, _duration(activity, durations))
+    for _, activity_id, completed, in_progress, total, start, finish in rows:
+        node = schedule.nodes.get(activity_id)
+        if node is not None:
+            node.set_progress(completed, in_progress, total, start, finish)
+    schedule.order = sorted(schedule.nodes, key=order.get)
+    schedule.compute(reference)
+    return schedule
+
+
+def get_schedules(db: Session, projects: List[models.Project]) -> List[ProjectSchedule]:
+    global _stale
+    today = date.today().toordinal()
+    reference = catalog.get_catalog(db)
+    # before the generation is read: a reload drops the cached schedules
+    durations = _get_durations(db)
+    with _lock:
+        generation = _generation
+        stale, _stale = _stale, False
+        cached = {}
+        for project in projects:
+            schedule = _schedules.get(project.project_id)
+            if schedule is not None and schedule.computed_on == today and schedule.program_type == project.program_type:
+                if schedule.project_name != project.project_name:
+                    schedule.project_name, schedule._bars = project.project_name, None
+                cached[project.project_id] = schedule
+
+    if stale and cached:
+        current = _fingerprints(db, list(cached))
+        for project_id in list(cached):
+            if current.get(project_id, (0, None)) != cached[project_id].fingerprint:
+                del cached[project_id]
+
+    missing = [project for project in projects if project.project_id not in cached]
+    if missing:
+        order = _graph_order(reference)
+        missing_ids = [project.project_id for project in missing]
+        fingerprints = _fingerprints(db, missing_ids)
+        rows_by_project = {project_id: [] for project_id in missing_ids}
+        progress = models.ProjectProgress
+        for start in range(0, len(missing_ids), PROJECT_CHUNK_SIZE):
+            chunk = missing_ids[start:start + PROJECT_CHUNK_SIZE]
+            for row in _progress_query(db).filter(progress.project_id.in_(chunk)).group_by(
+                progress.project_id, progress.activity_id
+            ):
+                rows_by_project[row[0]].append(row)
+        built = {
+            project.project_id: _build(
+                project, rows_by_project[project.project_id],
+                fingerprints.get(project.project_id, (0, None)), reference, order, durations, today,
+            )
+            for project in missing
+        }
+        with _lock:
+            # a write raced with this build: use the result once, do not cache it
+            if generation == _generation:
+                _schedules.update(built)
+        cached.update(built)
+
+    return [cached[project.project_id] for project in projects]
+
+
+def progress_changed(db: Session, project_id: str, activity_id: str):
+    # called by crud after a committed progress write; the queries run
+    # before taking the lock so concurrent writes are not serialized on it
+    global _generation
+    with _lock:
+        _generation += 1
+        generation = _generation
+        if project_id not in _schedules:
+            return
+    reference = catalog.get_catalog(db)
+    progress = models.ProjectProgress
+    row = _progress_query(db).filter(
+        progress.project_id == project_id, progress.activity_id == activity_id
+    ).group_by(progress.project_id, progress.activity_id).first()
+    fingerprint = _fingerprints(db, [project_id]).get(project_id, (0, None))
+    with _lock:
+        schedule = _schedules.get(project_id)
+        if schedule is None:
+            return
+        node = schedule.nodes.get(activity_id)
+        if generation != _generation or node is None or schedule.computed_on != date.today().toordinal():
+            # another write may have read newer rows than ours, or the
+            # activity is outside the cached network: rebuild on next use
+            del _schedules[project_id]
+            return
+        if row is None:
+            node.set_progress(0, 0, 0, None, None)
+        else:
+            node.set_progress(*row[2:])
+        schedule.fingerprint = fingerprint
+        schedule.update(activity_id, reference)
+
+
+def build_schedule(db: Session, filters: schemas.ReportFilter) -> List[schemas.ScheduleBar]:
+    query = db.query(models.Project).filter(models.Project.closed_at.is_(None))
+    if filters.project_ids:
+        query = query.filter(models.Project.project_id.in_(filters.project_ids))
+    projects = query.order_by(models.Project.project_name).all()
+    reference = catalog.get_catalog(db)
+    activity_ids = set(filters.activity_ids) if filters.activity_ids else None
+    bars = []
+    for schedule in get_schedules(db, projects):
+        with _lock:
+            bars.extend(schedule.bars(reference, activity_ids))
+    return bars
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date
 from enum import Enum
 
@@ -55,10 +55,12 @@ class ProjectUpdate(BaseModel):
     project_name: Optional[str] = None
     program_type: Optional[str] = None
     description: Optional[str] = None
+    closed: Optional[bool] = None
 
 class Project(ProjectBase):
     project_id: str
     created_by: str
+    closed_at: Optional[datetime] = None
     created_at: datetime
     
     class Config:
@@ -87,6 +89,7 @@ class ActivityBase(BaseModel):
     activity_type: ActivityType
     associated_with: AssociatedWith
     description: Optional[str] = None
+    estimated_duration_days: Optional[int] = None
 
 class ActivityCreate(ActivityBase):
     pass
@@ -96,6 +99,7 @@ class ActivityUpdate(BaseModel):
     activity_type: Optional[ActivityType] = None
     associated_with: Optional[AssociatedWith] = None
     description: Optional[str] = None
+    estimated_duration_days: Optional[int] = None
 
 class Activity(ActivityBase):
     activity_id: str
@@ -104,6 +108,20 @@ class Activity(ActivityBase):
     class Config:
         from_attributes = True
 
+class ActivityDependencyBase(BaseModel):
+    activity_id: str
+    depends_on_id: str
+
+class ActivityDependencyCreate(ActivityDependencyBase):
+    pass
+
+class ActivityDependency(ActivityDependencyBase):
+    dependency_id: str
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
 class ProjectSubsystemMappingBase(BaseModel):
     project_id: str
     subsystem_id: str
@@ -152,13 +170,45 @@ class LoginRequest(BaseModel):
 class LoginResponse(BaseModel):
     user: User
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
 
+class AuditEntry(BaseModel):
+    audit_id: int
+    entity: str
+    entity_id: str
+    action: str
+    user_id: Optional[str] = None
+    changes: Optional[dict] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Collections the client already holds are left out (null); versions has the
+# current token of every collection the role can read
+class Bootstrap(BaseModel):
+    users: Optional[List[User]] = None
+    projects: Optional[List[Project]] = None
+    subsystems: Optional[List[Subsystem]] = None
+    activities: Optional[List[Activity]] = None
+    activity_dependencies: Optional[List[ActivityDependency]] = None
+    project_subsystem_mappings: Optional[List[ProjectSubsystemMapping]] = None
+    project_progress: Optional[List[ProjectProgress]] = None
+    versions: Dict[str, str]
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 # Report schemas
 class ReportFilter(BaseModel):
     project_ids: Optional[List[str]] = None
     subsystem_ids: Optional[List[str]] = None
     activity_ids: Optional[List[str]] = None
+    include_archived: bool = False
 
 class ChartData(BaseModel):
     labels: List[str]
@@ -166,6 +216,20 @@ class ChartData(BaseModel):
     chart_type: str
     title: str
 
+class ScheduleBar(BaseModel):
+    project_id: str
+    project_name: str
+    activity_id: str
+    activity_name: str
+    status: str
+    start_date: date
+    finish_date: date
+    duration_days: int
+    latest_start: Optional[date] = None
+    slack_days: Optional[int] = None
+    is_critical: bool
+    forecast: bool
+
 class GanttData(BaseModel):
     activity_name: str
     project_name: str
@@ -173,4 +237,39 @@ class GanttData(BaseModel):
     start_date: date
     completion_date: date
     duration_days: int
-    status: str
\ No newline at end of file
+    status: str
+
+# Import schemas
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportResult(BaseModel):
+    entity: str
+    total_rows: int
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+# Search schemas
+class SearchResult(BaseModel):
+    entity_type: str
+    entity_id: str
+    title: Optional[str] = None
+    snippet: Optional[str] = None
+    rank: float
+
+class SearchResponse(BaseModel):
+    query: str
+    skip: int
+    limit: int
+    results: List[SearchResult]
+
+
+# Bulk delete schemas
+class BulkDeleteRequest(BaseModel):
+    ids: List[str]
+
+class BulkDeleteResult(BaseModel):
+    deleted: int
+    not_found: List[str]
@@ -0,0 +1,168 @@
+import os
+import re
+from typing import List, Optional
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+import models, schemas
+
+# SQLite FTS5 indexes over the searchable text columns. Each index is an
+# external-content table keyed by the source table's rowid and kept in sync
+# by triggers, so crud, bulk import and set-based deletes need no hooks.
+
+INDEXES = {
+    "project": ("projects", ["project_name", "description"]),
+    "activity": ("activities", ["activity_name", "description"]),
+    "subsystem": ("subsystems", ["subsystem_name", "description"]),
+    "note": ("project_progress", ["notes"]),
+}
+
+MAX_QUERY_TERMS = 8
+# matches per index that are ranked, newest first (see _top_query)
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "2000"))
+
+
+def _fts_table(entity: str) -> str:
+    return f"{INDEXES[entity][0]}_fts"
+
+
+def _create_statements(entity: str) -> List[str]:
+    table, columns = INDEXES[entity]
+    fts = _fts_table(entity)
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});"
+    insert_new = f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.rowid, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, content='{table}', content_rowid='rowid', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_indexes(engine):
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        for entity in INDEXES:
+            if _fts_table(entity) not in existing:
+                for statement in _create_statements(entity):
+                    conn.exec_driver_sql(statement)
+
+
+def rebuild_search_indexes(conn):
+    # Needed after anything that renumbers rowids, such as VACUUM.
+    # conn is a DB-API (sqlite3) connection
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for entity in INDEXES:
+        fts = _fts_table(entity)
+        if fts in existing:
+            conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def build_match_query(q: str) -> Optional[str]:
+    # Every word must match, the last one also as a prefix ("pow sub" finds
+    # "Power Subsystem"). Words are quoted so FTS5 syntax in user input is inert
+    terms = re.findall(r"\w+", q)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _id_column(entity: str) -> str:
+    return {
+        "project": "project_id",
+        "activity": "activity_id",
+        "subsystem": "subsystem_id",
+        "note": "progress_id",
+    }[entity]
+
+
+def _top_query(entity: str, filter_user: bool) -> str:
+    # Best :depth matches of one index. Only the newest :candidates matches
+    # are ranked: bm25 costs about a microsecond per match, and a term found
+    # in most notes would otherwise rank every one of them
+    table, _ = INDEXES[entity]
+    fts = _fts_table(entity)
+    owner_filter = ""
+    if filter_user:
+        # "+ 0" keeps this a filter on the matches; as a rowid constraint
+        # FTS5 would run the MATCH once per row of the user
+        owner_filter = f" AND {fts}.rowid + 0 IN (SELECT rowid FROM {table} WHERE user_id = :user_id)"
+    return (
+        f"SELECT * FROM (SELECT '{entity}' AS entity_type, rowid, rank FROM ("
+        f"SELECT {fts}.rowid AS rowid, {fts}.rank AS rank FROM {fts} "
+        f"WHERE {fts} MATCH :match{owner_filter} ORDER BY {fts}.rowid DESC LIMIT :candidates"
+        f") ORDER BY rank LIMIT :depth)"
+    )
+
+
+def _page_query(entity: str) -> str:
+    # Source row, title and snippet for the rows of the page only. Looking the
+    # rows up one rowid at a time would repeat the MATCH (and the expansion
+    # of a prefix term) per row, so one cursor covers the page's rowid range
+    # and the IN list only filters
+    table, columns = INDEXES[entity]
+    fts = _fts_table(entity)
+    if entity == "note":
+        title = "(SELECT project_name FROM projects WHERE projects.project_id = src.project_id)"
+    else:
+        title = f"src.{columns[0]}"
+    page_rows = f"FROM page WHERE entity_type = '{entity}'"
+    return (
+        f"SELECT '{entity}' AS entity_type, src.{_id_column(entity)} AS entity_id, {title} AS title, "
+        f"snippet({fts}, -1, '[', ']', '...', 12) AS snippet, "
+        f"(SELECT rank {page_rows} AND page.rowid = {fts}.rowid) AS rank "
+        f"FROM {fts} JOIN {table} AS src ON src.rowid = {fts}.rowid "
+        f"WHERE {fts} MATCH :match "
+        f"AND {fts}.rowid BETWEEN (SELECT MIN(rowid) {page_rows}) AND (SELECT MAX(rowid) {page_rows}) "
+        f"AND +{fts}.rowid IN (SELECT rowid {page_rows})"
+    )
+
+
+def search(db: Session, q: str, current_user: models.User, entity_types: Optional[List[str]] = None,
+           skip: int = 0, limit: int = 20) -> schemas.SearchResponse:
+    match = build_match_query(q)
+    entity_types = [entity for entity in (entity_types or INDEXES) if entity in INDEXES]
+    if match is None or not entity_types:
+        return schemas.SearchResponse(query=q, skip=skip, limit=limit, results=[])
+
+    # engineers only see their own progress notes
+    filter_user = current_user.role == "ENGINEER"
+    # No page reaches past the best skip + limit matches of any index, so
+    # those are ranked per index from FTS5 alone and merged; only the page is
+    # joined to the source rows and given a snippet
+    top = " UNION ALL ".join(_top_query(entity, filter_user and entity == "note") for entity in entity_types)
+    pages = " UNION ALL ".join(_page_query(entity) for entity in entity_types)
+    statement = text(
+        f"WITH top AS ({top}), page AS (SELECT entity_type, rowid, rank FROM top ORDER BY rank LIMIT :limit OFFSET :skip) "
+        f"{pages} ORDER BY rank"
+    )
+    params = {
+        "match": match, "limit": limit, "skip": skip,
+        "depth": skip + limit, "candidates": max(SEARCH_CANDIDATES, skip + limit),
+    }
+    if filter_user and "note" in entity_types:
+        statement = statement.bindparams(bindparam("user_id", type_=models.UUIDKey()))
+        params["user_id"] = current_user.user_id
+    statement = statement.columns(entity_id=models.UUIDKey())
+
+    results = [
+        schemas.SearchResult(
+            entity_type=row.entity_type,
+            entity_id=row.entity_id,
+            title=row.title,
+            snippet=row.snippet,
+            rank=row.rank,
+        )
+        for row in db.execute(statement, params)
+    ]
+    return schemas.SearchResponse(query=q, skip=skip, limit=limit, results=results)
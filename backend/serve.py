@@ -0,0 +1,41 @@
+import argparse
+import os
+
+import uvicorn
+
+# Production launcher: N uvicorn worker processes sharing one port. Schema
+# setup and seeding run once here, before the workers start, so the workers
+# never race each other creating tables or default rows.
+#
+#   python serve.py [--workers 8] [--port 8000]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with multiple worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("BACKLOG", "2048")))
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE_SECONDS", "15")),
+                        help="seconds an idle keep-alive connection is held open")
+    args = parser.parse_args(argv)
+
+    import main as app_module
+    app_module.seed_defaults()
+    # no audit writer runs in this process
+    app_module.audit.buffer.flush()
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        proxy_headers=True,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Callable, Iterable, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+import models
+from database import engine
+
+# Per-table change versions, bumped by crud inside every write transaction.
+# Used to build ETag / Last-Modified headers for conditional GETs and as the
+# invalidation channel for in-process caches: the counters live in the
+# cache_versions table, and every worker process polls that table so a write
+# in one worker reaches the caches of all others within POLL_INTERVAL_SECONDS.
+
+POLL_INTERVAL_SECONDS = float(os.getenv("CACHE_POLL_INTERVAL_SECONDS", "1.0"))
+
+logger = logging.getLogger(__name__)
+
+_epoch = datetime(1970, 1, 1)
+_lock = threading.Lock()
+_versions = {}
+_listeners = []
+
+table = models.CacheVersion.__table__
+
+
+def on_change(tables: Iterable[str], callback: Callable[[], None]):
+    # callback runs when another process bumps one of the tables
+    _listeners.append((frozenset(tables), callback))
+
+
+def bump(db: Session, *tables: str):
+    # Runs in the caller's transaction, so the invalidation commits (or rolls
+    # back) together with the data; the local counters advance on commit
+    now = datetime.utcnow()
+    pending = db.info.setdefault("cache_versions", [])
+    for name in tables:
+        statement = insert(table).values(name=name, version=1, updated_at=now)
+        pending.append(db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"version": table.c.version + 1, "updated_at": now},
+        ).returning(table.c.name, table.c.version, table.c.updated_at)).one())
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(db: Session):
+    rows = db.info.pop("cache_versions", None)
+    if rows:
+        _apply(rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(db: Session):
+    db.info.pop("cache_versions", None)
+
+
+def _apply(rows) -> set:
+    # A counter that moved by more than our own increment was also bumped by
+    # another process since the last poll; its listeners have to run now,
+    # because the poller will find the counter up to date
+    changed = set()
+    with _lock:
+        for name, version, updated_at in rows:
+            known = _versions.get(name, (0, _epoch))[0]
+            if version <= known:
+                continue
+            if version != known + 1:
+                changed.add(name)
+            _versions[name] = (version, updated_at)
+    _notify(changed)
+    return changed
+
+
+def _notify(changed: set):
+    for tables, callback in _listeners:
+        if tables & changed:
+            callback()
+
+
+def sync():
+    with engine.connect() as conn:
+        rows = conn.execute(select(table.c.name, table.c.version, table.c.updated_at)).all()
+    changed = set()
+    with _lock:
+        for name, version, updated_at in rows:
+            if _versions.get(name, (0, _epoch))[0] != version:
+                _versions[name] = (version, updated_at)
+                changed.add(name)
+    _notify(changed)
+    return changed
+
+
+def get(table_name: str) -> Tuple[int, datetime]:
+    return _versions.get(table_name, (0, _epoch))
+
+
+def etag(tables: Iterable[str], variant: str = "") -> str:
+    # the timestamps make counters that went backwards (restored backup) differ
+    state = "|".join(f"{name}:{get(name)[0]}:{get(name)[1].isoformat()}" for name in tables)
+    digest = hashlib.sha1(f"{state}|{variant}".encode()).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+def last_modified(tables: Iterable[str]) -> str:
+    latest = max(get(name)[1] for name in tables)
+    return format_datetime(latest.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+
+
+class VersionPoller:
+    def __init__(self, interval: float = POLL_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        sync()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cache-version-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                sync()
+            except Exception:
+                logger.exception("cache version poll failed")